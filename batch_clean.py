@@ -0,0 +1,215 @@
+# Batch runner for the Data Sweeper App.
+# Replays a cleaning recipe exported from the Clean section over a folder of files:
+#
+#     python batch_clean.py recipe.json INPUT_DIR OUTPUT_DIR [--workers N] [--chunksize ROWS]
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cleaning import (
+    STREAMABLE_EXTENSIONS,
+    apply_operations,
+    chunk_reader,
+    load_recipe,
+    stream_operations_to_file
+)
+
+SUPPORTED_EXTENSIONS = [".csv", ".xlsx", ".xls", ".parquet", ".feather", ".arrow"]
+
+def read_table(path):
+    """Read a CSV, Excel, Parquet or Feather/Arrow IPC file into a dataframe"""
+    extension = os.path.splitext(path)[-1].lower()
+    if extension == ".csv":
+        return pd.read_csv(path)
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+    if extension in [".feather", ".arrow"]:
+        return pd.read_feather(path)
+    return pd.read_excel(path)
+
+def write_table(df, path):
+    """Write a dataframe in the format given by the file extension"""
+    extension = os.path.splitext(path)[-1].lower()
+    if extension == ".csv":
+        df.to_csv(path, index=False)
+    elif extension == ".parquet":
+        df.to_parquet(path, index=False)
+    elif extension in [".feather", ".arrow"]:
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_excel(path, index=False)
+
+def output_path_for(input_path, output_dir):
+    """Return the output path for an input file (.xls inputs are written as .xlsx)"""
+    name, extension = os.path.splitext(os.path.basename(input_path))
+    if extension.lower() == ".xls":
+        extension = ".xlsx"
+    return os.path.join(output_dir, name + extension)
+
+def check_output_paths(input_files, output_dir):
+    """Return a reason the outputs would overwrite an input or each other, or None if they are safe"""
+    inputs = {os.path.normcase(os.path.realpath(path)) for path in input_files}
+    if input_files and os.path.realpath(output_dir) == os.path.realpath(os.path.dirname(input_files[0])):
+        return "the output directory must be different from the input directory"
+    outputs = {}
+    for path in input_files:
+        output_path = os.path.normcase(os.path.realpath(output_path_for(path, output_dir)))
+        if output_path in inputs:
+            return f"{os.path.basename(path)} would be overwritten by its own output"
+        if output_path in outputs:
+            return (
+                f"{os.path.basename(outputs[output_path])} and {os.path.basename(path)} "
+                f"would both be written to {os.path.basename(output_path)}"
+            )
+        outputs[output_path] = path
+    return None
+
+@contextmanager
+def replace_when_written(output_path):
+    """Yield a temporary path next to output_path that replaces it only once writing succeeds"""
+    directory, name = os.path.split(output_path)
+    stem, extension = os.path.splitext(name)
+    # The extension is kept so the writers still pick the format from it
+    temp_path = os.path.join(directory, f".{stem}.{os.getpid()}.tmp{extension}")
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def clean_file_chunked(input_path, operations, output_dir, chunksize):
+    """Apply the recipe to a file chunk by chunk, without loading it into memory"""
+    started = time.perf_counter()
+    output_path = output_path_for(input_path, output_dir)
+    with replace_when_written(output_path) as temp_path:
+        rows_in, rows_out = stream_operations_to_file(
+            chunk_reader(input_path, chunksize), operations, temp_path
+        )
+    finished = time.perf_counter()
+
+    return {
+        "input": input_path,
+        "output": output_path,
+        "bytes": os.path.getsize(input_path),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "seconds": finished - started
+    }
+
+def clean_file(input_path, operations, output_dir, chunksize=None):
+    """Apply the recipe to one file and return timing details for the report"""
+    if chunksize and os.path.splitext(input_path)[-1].lower() in STREAMABLE_EXTENSIONS:
+        return clean_file_chunked(input_path, operations, output_dir, chunksize)
+
+    started = time.perf_counter()
+    df = read_table(input_path)
+    read_done = time.perf_counter()
+
+    rows_in = len(df)
+    df, _ = apply_operations(df, operations)
+    clean_done = time.perf_counter()
+
+    output_path = output_path_for(input_path, output_dir)
+    with replace_when_written(output_path) as temp_path:
+        write_table(df, temp_path)
+    finished = time.perf_counter()
+
+    return {
+        "input": input_path,
+        "output": output_path,
+        "bytes": os.path.getsize(input_path),
+        "rows_in": rows_in,
+        "rows_out": len(df),
+        "read_seconds": read_done - started,
+        "clean_seconds": clean_done - read_done,
+        "write_seconds": finished - clean_done,
+        "seconds": finished - started
+    }
+
+def find_input_files(input_dir):
+    """List the supported data files directly inside a directory"""
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if os.path.splitext(name)[-1].lower() in SUPPORTED_EXTENSIONS
+        and os.path.isfile(os.path.join(input_dir, name))
+    )
+
+def format_rate(bytes_count, seconds):
+    """Return a throughput in MB/s"""
+    return f"{bytes_count / (1024 * 1024) / seconds:.2f} MB/s" if seconds > 0 else "-"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a Data Sweeper cleaning recipe over a folder of data files.")
+    parser.add_argument("recipe", help="recipe JSON exported from the Clean section")
+    parser.add_argument("input_dir", help="directory containing the files to clean")
+    parser.add_argument("output_dir", help="directory to write the cleaned files to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: one per core)")
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help="process CSV, Parquet and Feather/Arrow files out of core in chunks of this many rows (for files larger than memory)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.recipe, encoding="utf-8") as recipe_file:
+        try:
+            operations = load_recipe(recipe_file.read())
+        except ValueError as e:
+            parser.error(f"invalid recipe {args.recipe}: {e}")
+
+    input_files = find_input_files(args.input_dir)
+    if not input_files:
+        print(f"No supported data files found in {args.input_dir}")
+        return 1
+    problem = check_output_paths(input_files, args.output_dir)
+    if problem:
+        parser.error(problem)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Cleaning {len(input_files)} files with {len(operations)} operations on {args.workers} workers")
+    started = time.perf_counter()
+    results = []
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(clean_file, path, operations, args.output_dir, args.chunksize): path
+            for path in input_files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED  {os.path.basename(path)}: {e}")
+                continue
+            results.append(result)
+            if "read_seconds" in result:
+                phases = (
+                    f"read {result['read_seconds']:.2f}s, clean {result['clean_seconds']:.2f}s, "
+                    f"write {result['write_seconds']:.2f}s, "
+                )
+            else:
+                phases = "streamed, "
+            print(
+                f"OK      {os.path.basename(path)}: {result['rows_in']:,} → {result['rows_out']:,} rows in "
+                f"{result['seconds']:.2f}s ({phases}{format_rate(result['bytes'], result['seconds'])})"
+            )
+
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(result["bytes"] for result in results)
+    total_rows = sum(result["rows_in"] for result in results)
+    print(
+        f"\n{len(results)} files cleaned, {failures} failed in {elapsed:.2f}s: "
+        f"{len(results) / elapsed:.2f} files/s, {total_rows / elapsed:,.0f} rows/s, {format_rate(total_bytes, elapsed)}"
+    )
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,789 @@
+# Cleaning operations shared by the Data Sweeper page and the batch runner.
+# Nothing in this module depends on Streamlit.
+import json
+import operator
+import os
+from io import BytesIO
+import numpy as np
+import pandas as pd
+
+from expressions import evaluate_expression, expression_columns, widen_numeric
+
+# pandas 3 always uses copy-on-write; pandas 2 offers it as an opt-in mode
+PANDAS_MAJOR_VERSION = int(pd.__version__.split('.')[0])
+if PANDAS_MAJOR_VERSION == 2:
+    pd.set_option("mode.copy_on_write", True)
+
+def make_working_copy(df):
+    """Return a processed copy of df that shares column data with the original until a column is written"""
+    if PANDAS_MAJOR_VERSION >= 2:
+        return df.copy(deep=False)
+    # Without copy-on-write a shallow copy could write through to the original
+    return df.copy()
+
+def _column_codes(series, single):
+    """Return integer codes for a column's values that are equal exactly when drop_duplicates treats them as equal"""
+    if single and series.dtype == object:
+        # A lone column is deduplicated by value, so None, NaN and NaT stay distinct from each other
+        uniques = pd.Index(pd.unique(series.to_numpy()), dtype=object)
+        if uniques.is_unique:
+            return uniques.get_indexer(series.to_numpy())
+    # Across several columns pandas factorizes each one, treating every missing value as equal
+    return pd.factorize(series, use_na_sentinel=not single)[0]
+
+def hash_rows(df, columns=None):
+    """Return one int64 label per row of df; rows get equal labels exactly when their values in columns are equal
+
+    Labels are built from exact equality codes, so mixed-type object columns ('1' and 1) are
+    never confused the way stringified hashes would confuse them.
+    """
+    frame = df if columns is None else df[list(columns)]
+    single = frame.shape[1] == 1
+    combined = np.zeros(len(frame), dtype=np.int64)
+    for _, series in frame.items():
+        codes = _column_codes(series, single).astype(np.int64) + 1
+        # Mixed-radix combination, re-factorized after each column so labels stay below the row count
+        combined = pd.factorize(combined * (int(codes.max(initial=0)) + 1) + codes)[0]
+    return combined
+
+class RowHashIndex:
+    """Per-row equality labels of a frame (see hash_rows), computed once per column subset
+
+    The index is kept in sync with the frame as rows are dropped, so repeated
+    duplicate checks never rehash the table.
+    """
+
+    def __init__(self, hashes=None):
+        # Maps a tuple of column names (None for all columns) to a row hash array
+        self._hashes = hashes or {}
+
+    def hashes(self, df, subset=None):
+        key = tuple(subset) if subset else None
+        if key not in self._hashes:
+            self._hashes[key] = hash_rows(df, key)
+        return self._hashes[key]
+
+    def duplicated(self, df, subset=None):
+        """Return a boolean array marking every repeat of an earlier row"""
+        return pd.Series(self.hashes(df, subset)).duplicated().to_numpy()
+
+    def take(self, mask):
+        """Return the index of the rows selected by a boolean mask"""
+        return RowHashIndex({key: hashes[mask] for key, hashes in self._hashes.items()})
+
+    def without_columns(self, columns):
+        """Return the index with every hash involving the given columns discarded"""
+        columns = set(columns)
+        return RowHashIndex({
+            key: hashes for key, hashes in self._hashes.items()
+            if key is not None and not columns.intersection(key)
+        })
+
+    def renamed(self, mapping):
+        return RowHashIndex({
+            (None if key is None else tuple(mapping.get(col, col) for col in key)): hashes
+            for key, hashes in self._hashes.items()
+        })
+
+def _carry_forward_stats(stats, df, change):
+    """Derive statistics for df from those of the frame it was produced from, or None to rescan"""
+    op = change["op"]
+    null_counts = stats["null_counts"]
+    row_hashes = stats["row_hashes"]
+
+    if op == "drop_columns":
+        return {
+            "null_counts": null_counts.drop(change["columns"]),
+            "row_hashes": row_hashes.without_columns(change["columns"]),
+            "duplicates": None
+        }
+    if op == "rename_columns":
+        return {
+            "null_counts": null_counts.rename(index=change["mapping"]),
+            "row_hashes": row_hashes.renamed(change["mapping"]),
+            "duplicates": stats["duplicates"]
+        }
+    if op == "update_columns":
+        # Only the touched columns need recounting
+        null_counts = null_counts.copy()
+        for col in change["columns"]:
+            null_counts[col] = df[col].isna().sum()
+        return {
+            "null_counts": null_counts.reindex(df.columns),
+            "row_hashes": row_hashes.without_columns(change["columns"]),
+            "duplicates": None
+        }
+    if op == "filter_rows":
+        # change["mask"] marks the kept rows of the previous frame
+        return {
+            "null_counts": null_counts - change["dropped_null_counts"],
+            "row_hashes": row_hashes.take(change["mask"]),
+            "duplicates": None
+        }
+    return None
+
+# Cleaning operations are plain dicts such as {"op": "drop_columns", "columns": ["A"]},
+# so they can be applied immediately, queued in a plan, or fused with their neighbours.
+
+# Row filters are evaluated against one shared keep-mask when fused
+ROW_FILTER_OPERATIONS = {"drop_duplicates", "dropna", "remove_outliers", "filter_range"}
+
+# Adjacent operations of these kinds run as a single step
+FUSIBLE_OPERATIONS = {"fillna", "drop_columns", "rename_columns", "filter_rows"}
+
+ARITHMETIC_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+
+def describe_operation(operation):
+    """Return a short human-readable description of a cleaning operation"""
+    op = operation["op"]
+    if op == "drop_duplicates":
+        subset = operation.get("subset")
+        return f"Remove duplicate rows (comparing {', '.join(subset)})" if subset else "Remove duplicate rows"
+    if op == "dropna":
+        return "Drop rows with missing values"
+    if op == "fillna":
+        fill = operation["value"] if operation["strategy"] == "value" else operation["strategy"]
+        return f"Fill missing values in {', '.join(operation['columns'])} with {fill}"
+    if op == "rename_columns":
+        return "Rename " + ", ".join(f"'{old}' → '{new}'" for old, new in operation["mapping"].items())
+    if op == "drop_columns":
+        return f"Drop columns {', '.join(operation['columns'])}"
+    if op == "calculate_column":
+        return f"Create '{operation['column']}' = {operation['left']} {operation['operator']} {operation['right']}"
+    if op == "expression_column":
+        return f"Create '{operation['column']}' = {operation['expression']}"
+    if op == "convert_type":
+        return f"Convert {operation['column']} to {operation['target']}"
+    if op == "text_operations":
+        return f"{', '.join(operation['operations'])} on {operation['column']}"
+    if op == "remove_outliers":
+        method = "Z-Score" if operation["method"] == "zscore" else "IQR"
+        return f"Remove {method} outliers in {operation['column']} (threshold {operation['threshold']})"
+    if op == "filter_range":
+        return f"Keep rows with {operation['column']} between {operation['lower']} and {operation['upper']}"
+    return op
+
+def fuse_operations(operations):
+    """Group adjacent operations of the same kind into (kind, operations) steps"""
+    steps = []
+    for operation in operations:
+        kind = "filter_rows" if operation["op"] in ROW_FILTER_OPERATIONS else operation["op"]
+        if steps and steps[-1][0] == kind and kind in FUSIBLE_OPERATIONS:
+            steps[-1][1].append(operation)
+        else:
+            steps.append((kind, [operation]))
+    return steps
+
+def _run_fillna(df, operations):
+    """Resolve all fill values up front and fill every column with one fillna call"""
+    fills = {}
+    for operation in operations:
+        for col in operation["columns"]:
+            # Once filled, later fills of the same column have nothing left to fill
+            if col in fills:
+                continue
+            if operation["strategy"] == "mean":
+                fills[col] = df[col].mean()
+            elif operation["strategy"] == "median":
+                fills[col] = df[col].median()
+            else:
+                fills[col] = operation["value"]
+
+    # Categorical columns only accept values from their categories
+    categorical_fills = [
+        col for col, value in fills.items()
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories
+    ]
+    if categorical_fills:
+        df = make_working_copy(df)
+        for col in categorical_fills:
+            df[col] = df[col].cat.add_categories([fills[col]])
+
+    return df.fillna(fills), {"op": "update_columns", "columns": list(fills)}
+
+def _compose_renames(operations):
+    """Collapse a sequence of rename mappings into one mapping from the original names"""
+    mapping = {}
+    for operation in operations:
+        for old, new in operation["mapping"].items():
+            source = next((orig for orig, current in mapping.items() if current == old), old)
+            mapping[source] = new
+    return {old: new for old, new in mapping.items() if old != new}
+
+def _outlier_keep_mask(series, keep, operation):
+    """Return a mask of values inside the outlier bounds, with bounds computed over the kept rows"""
+    kept = series[keep]
+    threshold = operation["threshold"]
+    if operation["method"] == "zscore":
+        z_scores = np.abs((series - kept.mean()) / kept.std())
+        inside = z_scores <= threshold
+    else:
+        q1 = kept.quantile(0.25)
+        q3 = kept.quantile(0.75)
+        iqr = q3 - q1
+        inside = (series >= q1 - threshold * iqr) & (series <= q3 + threshold * iqr)
+    return inside.to_numpy(dtype=bool, na_value=False)
+
+def _run_row_filters(df, operations, row_hashes=None):
+    """Combine consecutive row filters into one boolean mask and materialize it once"""
+    row_hashes = row_hashes or RowHashIndex()
+    keep = np.ones(len(df), dtype=bool)
+
+    for operation in operations:
+        op = operation["op"]
+        if op == "dropna":
+            keep &= df.notna().all(axis=1).to_numpy()
+        elif op == "drop_duplicates":
+            # Only rows still kept take part in the duplicate check
+            positions = np.flatnonzero(keep)
+            hashes = row_hashes.hashes(df, operation.get("subset"))[positions]
+            keep[positions[pd.Series(hashes).duplicated().to_numpy()]] = False
+        elif op == "remove_outliers":
+            keep &= _outlier_keep_mask(df[operation["column"]], keep, operation)
+        elif op == "filter_range":
+            inside = df[operation["column"]].between(operation["lower"], operation["upper"])
+            keep &= inside.to_numpy(dtype=bool, na_value=False)
+
+    change = {"op": "filter_rows", "mask": keep, "dropped_null_counts": df[~keep].isna().sum()}
+    return df[keep], change
+
+def _run_operation(df, operation):
+    """Apply a single column-level operation, returning the new frame and what changed"""
+    op = operation["op"]
+    df = make_working_copy(df)
+
+    if op == "calculate_column":
+        calculate = ARITHMETIC_OPERATORS[operation["operator"]]
+        # Compacted int8/float32 columns would otherwise wrap around or lose precision
+        df[operation["column"]] = calculate(widen_numeric(df[operation["left"]]), widen_numeric(df[operation["right"]]))
+        changed = [operation["column"]]
+
+    elif op == "expression_column":
+        df[operation["column"]] = evaluate_expression(operation["expression"], df)
+        changed = [operation["column"]]
+
+    elif op == "convert_type":
+        col = operation["column"]
+        target = operation["target"]
+        if target == "string":
+            df[col] = df[col].astype(str)
+        elif target == "integer":
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif target == "float":
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif target == "datetime":
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif target == "category":
+            df[col] = df[col].astype('category')
+        changed = [col]
+
+    elif op == "text_operations":
+        col = operation["column"]
+        text_operations = operation["operations"]
+        changed = [col]
+        if "Lowercase" in text_operations:
+            df[col] = df[col].str.lower()
+        if "Uppercase" in text_operations:
+            df[col] = df[col].str.upper()
+        if "Remove whitespace" in text_operations:
+            df[col] = df[col].str.strip()
+        if "Remove special characters" in text_operations:
+            df[col] = df[col].str.replace(r'[^\w\s]', '', regex=True)
+        if "Extract numbers" in text_operations:
+            new_col = f"{col}_numbers"
+            df[new_col] = df[col].str.extract(r'(\d+)', expand=False)
+            changed.append(new_col)
+
+    else:
+        raise ValueError(f"Unknown cleaning operation: {op}")
+
+    return df, {"op": "update_columns", "columns": changed}
+
+def apply_operations(df, operations, stats=None):
+    """Run cleaning operations with adjacent steps fused; returns (df, carried-forward stats)"""
+    for kind, group in fuse_operations(operations):
+        if kind == "fillna":
+            df, change = _run_fillna(df, group)
+        elif kind == "drop_columns":
+            columns = list(dict.fromkeys(col for operation in group for col in operation["columns"]))
+            df = df.drop(columns=columns)
+            change = {"op": "drop_columns", "columns": columns}
+        elif kind == "rename_columns":
+            mapping = _compose_renames(group)
+            df = df.rename(columns=mapping)
+            change = {"op": "rename_columns", "mapping": mapping}
+        elif kind == "filter_rows":
+            df, change = _run_row_filters(df, group, stats["row_hashes"] if stats else None)
+        else:
+            df, change = _run_operation(df, group[0])
+
+        if stats is not None:
+            stats = _carry_forward_stats(stats, df, change)
+    return df, stats
+
+# Operations that may appear in a recipe, with the keys each one needs
+# (a fillna with strategy "value" also needs "value")
+OPERATION_KEYS = {
+    "drop_duplicates": (),
+    "dropna": (),
+    "remove_outliers": ("column", "method", "threshold"),
+    "filter_range": ("column", "lower", "upper"),
+    "fillna": ("strategy", "columns"),
+    "drop_columns": ("columns",),
+    "rename_columns": ("mapping",),
+    "calculate_column": ("column", "left", "operator", "right"),
+    "expression_column": ("column", "expression"),
+    "convert_type": ("column", "target"),
+    "text_operations": ("column", "operations")
+}
+KNOWN_OPERATIONS = set(OPERATION_KEYS)
+
+RECIPE_VERSION = 1
+
+def recipe_to_json(operations):
+    """Serialize a list of cleaning operations as a JSON recipe"""
+    return json.dumps({"version": RECIPE_VERSION, "operations": operations}, indent=2, default=str)
+
+def load_recipe(text):
+    """Parse a JSON recipe and return its list of cleaning operations"""
+    recipe = json.loads(text)
+    if not isinstance(recipe, dict) or not isinstance(recipe.get("operations"), list):
+        raise ValueError("A recipe must be a JSON object with an 'operations' list")
+    if recipe.get("version", RECIPE_VERSION) > RECIPE_VERSION:
+        raise ValueError(f"Unsupported recipe version: {recipe['version']}")
+
+    for step, operation in enumerate(recipe["operations"], start=1):
+        if not isinstance(operation, dict) or operation.get("op") not in KNOWN_OPERATIONS:
+            raise ValueError(f"Unknown cleaning operation in recipe: {operation!r}")
+        required = OPERATION_KEYS[operation["op"]]
+        if operation["op"] == "fillna" and operation.get("strategy") == "value":
+            required += ("value",)
+        missing = [key for key in required if key not in operation]
+        if missing:
+            raise ValueError(f"Recipe step {step} ({operation['op']}) is missing {', '.join(repr(key) for key in missing)}")
+        for key, kind in (("columns", list), ("operations", list), ("mapping", dict)):
+            if key in required and not isinstance(operation[key], kind):
+                raise ValueError(f"Recipe step {step} ({operation['op']}): '{key}' must be a {kind.__name__}")
+    return recipe["operations"]
+
+# Out-of-core execution: the file is read as an iterator of bounded-size chunks and every
+# cleaned chunk is written out before the next one is read.
+
+# Operations that need the whole file at once
+OUT_OF_CORE_UNSUPPORTED = {"drop_duplicates"}
+
+def needs_global_statistics(operation):
+    """Return True if an operation depends on statistics of the whole column"""
+    return operation["op"] == "remove_outliers" or (operation["op"] == "fillna" and operation["strategy"] != "value")
+
+# Quantiles are exact but never hold a whole column: values are mapped to order-preserving
+# 64-bit keys and each extra pass over the data counts the next QUANTILE_RADIX_BITS bits of the
+# keys inside the bucket that holds a wanted order statistic (a radix selection). Once that
+# bucket holds at most QUANTILE_EXACT_VALUES values they are gathered and sorted, which usually
+# ends the search two or three passes after the first scan.
+QUANTILE_RADIX_BITS = 16
+QUANTILE_EXACT_VALUES = 1_000_000
+
+def _column_values(series):
+    """Return the non-missing numeric values of a column as float64"""
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[~np.isnan(values)]
+
+def _order_keys(values):
+    """Map float64 values to uint64 keys that sort in the same order"""
+    bits = values.view(np.uint64)
+    return np.where(bits >> 63, ~bits, bits | (1 << 63))
+
+def _key_value(key):
+    """Invert _order_keys for one key"""
+    key = np.uint64(key)
+    bits = key & ~np.uint64(1 << 63) if key >> np.uint64(63) else ~key
+    return float(np.array([bits], dtype=np.uint64).view(np.float64)[0])
+
+class _OrderStatistic:
+    """Radix-selection state for the value of a given 0-based rank of a column"""
+
+    def __init__(self, rank):
+        self.rank = rank  # rank among the keys that start with prefix
+        self.prefix = 0
+        self.bits = 0
+        self.gather = False
+        self.value = None
+
+    def start_pass(self):
+        self.found = [] if self.gather else np.zeros(1 << QUANTILE_RADIX_BITS, dtype=np.int64)
+
+    def update(self, keys):
+        if self.bits:
+            keys = keys[(keys >> (64 - self.bits)) == self.prefix]
+        if self.gather:
+            self.found.append(keys)
+        else:
+            buckets = (keys >> (64 - self.bits - QUANTILE_RADIX_BITS)) & ((1 << QUANTILE_RADIX_BITS) - 1)
+            self.found += np.bincount(buckets.astype(np.intp), minlength=len(self.found))
+
+    def finish_pass(self):
+        if self.gather:
+            self.value = _key_value(np.sort(np.concatenate(self.found))[self.rank])
+        else:
+            cumulative = np.cumsum(self.found)
+            bucket = int(np.searchsorted(cumulative, self.rank, side="right"))
+            self.rank -= int(cumulative[bucket - 1]) if bucket else 0
+            self.prefix = (self.prefix << QUANTILE_RADIX_BITS) | bucket
+            self.bits += QUANTILE_RADIX_BITS
+            if self.bits == 64:
+                self.value = _key_value(self.prefix)
+            self.gather = self.found[bucket] <= QUANTILE_EXACT_VALUES
+        del self.found
+
+class _ColumnAccumulator:
+    """Streaming count/mean/variance of a column, plus the order statistics its quantiles need"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.quantiles = set()
+        self.order = {}
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        # Chan et al. parallel merge of the running moments with the chunk's moments
+        count = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def _ranks(self, q):
+        # numpy's default (linear) interpolation between the two closest ranks
+        position = (self.count - 1) * q
+        lower = int(np.floor(position))
+        return lower, min(lower + 1, self.count - 1), position - lower
+
+    def plan_order_statistics(self):
+        """Create the order statistics needed for the requested quantiles (after the first scan)"""
+        for q in self.quantiles if self.count else ():
+            lower, upper, _ = self._ranks(q)
+            for rank in (lower, upper):
+                self.order.setdefault(rank, _OrderStatistic(rank))
+
+    def quantile(self, q):
+        if not self.count:
+            return np.nan
+        lower, upper, fraction = self._ranks(q)
+        low, high = self.order[lower].value, self.order[upper].value
+        return float(low + (high - low) * fraction)
+
+def _scan_statistics(read_chunks, prefix, batch):
+    """Make passes over the data (with prefix applied) gathering what batch needs"""
+    accumulators = {}
+    for operation in batch:
+        columns = operation["columns"] if operation["op"] == "fillna" else [operation["column"]]
+        for col in columns:
+            accumulator = accumulators.setdefault(col, _ColumnAccumulator())
+            if operation.get("strategy") == "median":
+                accumulator.quantiles.add(0.5)
+            elif operation.get("method") == "iqr":
+                accumulator.quantiles.update((0.25, 0.75))
+
+    for chunk in read_chunks():
+        chunk, _ = apply_operations(chunk, prefix)
+        for col, accumulator in accumulators.items():
+            accumulator.update(_column_values(chunk[col]))
+
+    for accumulator in accumulators.values():
+        accumulator.plan_order_statistics()
+    while True:
+        pending = {col: [statistic for statistic in accumulator.order.values() if statistic.value is None]
+                   for col, accumulator in accumulators.items()}
+        pending = {col: statistics for col, statistics in pending.items() if statistics}
+        if not pending:
+            return accumulators
+        for statistics in pending.values():
+            for statistic in statistics:
+                statistic.start_pass()
+        for chunk in read_chunks():
+            chunk, _ = apply_operations(chunk, prefix)
+            for col, statistics in pending.items():
+                keys = _order_keys(_column_values(chunk[col]))
+                for statistic in statistics:
+                    statistic.update(keys)
+        for statistics in pending.values():
+            for statistic in statistics:
+                statistic.finish_pass()
+
+def _resolve_batch(batch, accumulators):
+    """Rewrite statistics-based operations as row-local ones using scanned statistics"""
+    resolved = []
+    for operation in batch:
+        if operation["op"] == "fillna":
+            for col in operation["columns"]:
+                accumulator = accumulators[col]
+                value = accumulator.mean if operation["strategy"] == "mean" else accumulator.quantile(0.5)
+                if accumulator.count:
+                    resolved.append({"op": "fillna", "strategy": "value", "columns": [col], "value": value})
+        else:
+            accumulator = accumulators[operation["column"]]
+            threshold = operation["threshold"]
+            if operation["method"] == "zscore":
+                std = accumulator.std()
+                lower, upper = accumulator.mean - threshold * std, accumulator.mean + threshold * std
+            else:
+                q1, q3 = accumulator.quantile(0.25), accumulator.quantile(0.75)
+                lower, upper = q1 - threshold * (q3 - q1), q3 + threshold * (q3 - q1)
+            resolved.append({"op": "filter_range", "column": operation["column"], "lower": lower, "upper": upper})
+    return resolved
+
+def resolve_global_statistics(read_chunks, operations):
+    """Replace operations that need whole-column statistics with row-local equivalents
+
+    read_chunks() must return a fresh iterator over the data's chunks on every call;
+    statistics are gathered in separate passes before the data is written.
+    """
+    resolved = []
+    i = 0
+    while i < len(operations):
+        operation = operations[i]
+        if operation["op"] in OUT_OF_CORE_UNSUPPORTED:
+            raise ValueError(f"'{describe_operation(operation)}' needs the whole file and is not available out of core")
+        if not needs_global_statistics(operation):
+            resolved.append(operation)
+            i += 1
+            continue
+
+        # Mean/median fills never change each other's statistics, so adjacent ones share a pass;
+        # an outlier filter changes the rows seen by later steps and gets its own pass
+        batch = [operation]
+        if operation["op"] == "fillna":
+            while (i + len(batch) < len(operations)
+                   and operations[i + len(batch)]["op"] == "fillna"
+                   and needs_global_statistics(operations[i + len(batch)])):
+                batch.append(operations[i + len(batch)])
+
+        resolved.extend(_resolve_batch(batch, _scan_statistics(read_chunks, resolved, batch)))
+        i += len(batch)
+    return resolved
+
+# File formats that can be read and written chunk by chunk
+STREAMABLE_EXTENSIONS = [".csv", ".parquet", ".feather", ".arrow"]
+
+def read_excel_bytes(data, **read_options):
+    """Parse an Excel workbook from its raw bytes (module level so it can run in a worker process)"""
+    return pd.read_excel(BytesIO(data), **read_options)
+
+def read_file_columns(path):
+    """Return the column names of a CSV, Parquet or Feather/Arrow IPC file without reading its rows"""
+    extension = os.path.splitext(path)[-1].lower()
+    if extension == ".csv":
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if extension in [".feather", ".arrow"]:
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    raise ValueError(f"Unsupported file type: {extension}")
+
+def iter_file_chunks(path, chunksize, columns=None, dtype=None):
+    """Yield a file as dataframes of at most chunksize rows, reading only the given columns
+
+    Parquet is read by record batch and Feather/Arrow IPC files are memory-mapped, so
+    columns that are not selected are never decoded. dtype is passed to read_csv for CSV files.
+    """
+    extension = os.path.splitext(path)[-1].lower()
+    if extension == ".csv":
+        with pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=dtype) as reader:
+            yield from reader
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+        with pq.ParquetFile(path) as parquet_file:
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+    elif extension in [".feather", ".arrow"]:
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(start, chunksize).to_pandas()
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+
+def _merge_chunk_dtypes(first, second):
+    """Return a dtype that holds the values of two chunks read with dtypes first and second"""
+    if first == second:
+        return first
+    numeric = [pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in (first, second)]
+    if all(numeric):
+        return np.dtype(np.float64)
+    # A text column whose chunk was all missing (read as float) stays text
+    for dtype in (first, second):
+        if isinstance(dtype, pd.StringDtype):
+            return dtype
+    return np.dtype(object)
+
+def scan_csv_dtypes(path, chunksize, columns=None):
+    """Read a CSV once and return the column dtypes that fit every chunk
+
+    read_csv infers dtypes per chunk, so a column can be float in one chunk (all missing) and
+    text in the next; reading every chunk with the merged dtypes keeps them consistent.
+    """
+    dtypes = {}
+    with pd.read_csv(path, chunksize=chunksize, usecols=columns) as reader:
+        for chunk in reader:
+            for col, dtype in chunk.dtypes.items():
+                dtypes[col] = _merge_chunk_dtypes(dtypes[col], dtype) if col in dtypes else dtype
+    return dtypes
+
+def chunk_reader(path, chunksize, columns=None):
+    """Return a function that yields the file's chunks with the same dtypes in every chunk
+
+    For CSV files the dtypes are settled by one extra pass over the file on the first call.
+    """
+    dtypes = {}
+
+    def read_chunks():
+        if os.path.splitext(path)[-1].lower() == ".csv" and "settled" not in dtypes:
+            dtypes["settled"] = scan_csv_dtypes(path, chunksize, columns)
+        return iter_file_chunks(path, chunksize, columns, dtype=dtypes.get("settled"))
+    return read_chunks
+
+def write_file_chunks(chunks, output_path):
+    """Write an iterator of dataframes to one CSV, Parquet or Feather/Arrow IPC file
+
+    Columnar files take their schema from the first chunk (columns that are entirely missing
+    there are typed as text) and every later chunk is cast to it. A partly written file is
+    removed when writing fails.
+    """
+    extension = os.path.splitext(output_path)[-1].lower()
+    if extension not in STREAMABLE_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {extension}")
+    try:
+        if extension == ".csv":
+            with open(output_path, "w", newline="", encoding="utf-8") as output:
+                for i, chunk in enumerate(chunks):
+                    chunk.to_csv(output, header=(i == 0), index=False)
+        else:
+            _write_arrow_chunks(chunks, output_path, extension)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+def _streamable_field(field):
+    """Return a field type every chunk can be cast to
+
+    All-missing columns are typed as text, and categories as their values: each chunk has its
+    own categories, which neither the dictionary index type nor an IPC file can change later.
+    """
+    import pyarrow as pa
+    if pa.types.is_null(field.type):
+        return field.with_type(pa.string())
+    if pa.types.is_dictionary(field.type):
+        return field.with_type(field.type.value_type)
+    return field
+
+def _write_arrow_chunks(chunks, output_path, extension):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = None
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = pa.schema([_streamable_field(field) for field in table.schema], metadata=table.schema.metadata)
+                if extension == ".parquet":
+                    writer = pq.ParquetWriter(output_path, schema)
+                else:
+                    writer = pa.ipc.new_file(output_path, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def project_operations(operations, columns, available_columns):
+    """Work out which source columns must be read to produce columns after operations
+
+    Returns (read_columns, operations) with drop steps trimmed to the columns actually read,
+    or (None, operations) when the operations can depend on every column.
+    """
+    needed = set(columns)
+    for operation in reversed(operations):
+        op = operation["op"]
+        if op == "dropna" or (op == "drop_duplicates" and not operation.get("subset")):
+            return None, operations
+        if op == "rename_columns":
+            original_names = {new: old for old, new in operation["mapping"].items()}
+            needed = {original_names.get(col, col) for col in needed}
+        elif op == "drop_duplicates":
+            needed.update(operation["subset"])
+        elif op == "fillna":
+            needed.update(operation["columns"])
+        elif op == "calculate_column":
+            needed.discard(operation["column"])
+            needed.update([operation["left"], operation["right"]])
+        elif op == "expression_column":
+            needed.discard(operation["column"])
+            needed.update(expression_columns(operation["expression"]))
+        elif op == "text_operations" and "Extract numbers" in operation["operations"]:
+            needed.discard(f"{operation['column']}_numbers")
+            needed.add(operation["column"])
+        elif op != "drop_columns":
+            needed.add(operation["column"])
+
+    read_columns = [col for col in available_columns if col in needed]
+
+    # Dropping a column that was never read would fail, so drop steps only keep columns present
+    present = set(read_columns)
+    projected = []
+    for operation in operations:
+        op = operation["op"]
+        if op == "drop_columns":
+            operation = {**operation, "columns": [col for col in operation["columns"] if col in present]}
+            if not operation["columns"]:
+                continue
+            present.difference_update(operation["columns"])
+        elif op == "rename_columns":
+            present = {operation["mapping"].get(col, col) for col in present}
+        elif op in ("calculate_column", "expression_column"):
+            present.add(operation["column"])
+        elif op == "text_operations" and "Extract numbers" in operation["operations"]:
+            present.add(f"{operation['column']}_numbers")
+        projected.append(operation)
+    return read_columns, projected
+
+def stream_operations_to_file(read_chunks, operations, output_path, columns=None, row_filter=None):
+    """Clean data chunk by chunk, appending every cleaned chunk to a CSV, Parquet or Feather/Arrow IPC file
+
+    columns optionally selects the output columns and row_filter(chunk) returns a boolean
+    mask of rows to keep. Returns (rows_in, rows_out).
+    """
+    resolved = resolve_global_statistics(read_chunks, operations)
+    counts = {"rows_in": 0, "rows_out": 0}
+
+    def cleaned_chunks():
+        for chunk in read_chunks():
+            counts["rows_in"] += len(chunk)
+            chunk, _ = apply_operations(chunk, resolved)
+            if row_filter is not None:
+                chunk = chunk[row_filter(chunk)]
+            if columns is not None:
+                chunk = chunk[columns]
+            counts["rows_out"] += len(chunk)
+            yield chunk
+
+    write_file_chunks(cleaned_chunks(), output_path)
+    return counts["rows_in"], counts["rows_out"]
@@ -0,0 +1,446 @@
+# Restricted expression language for computed columns and row filters.
+# Expressions are parsed with ast, checked against a whitelist and compiled into a plan that
+# computes every distinct subexpression once over whole columns; eval() is never used.
+# Nothing in this module depends on Streamlit.
+import ast
+import operator
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+MAX_EXPRESSION_LENGTH = 10_000
+# Largest width or position accepted by .str.pad/zfill/slice, and the most that .str.replace
+# or .str.cat may add to a row, so no expression can make every row arbitrarily long
+MAX_TEXT_WIDTH = 1_000
+
+class ExpressionError(ValueError):
+    """Raised for expressions that don't parse or use anything outside the whitelist"""
+
+def widen_numeric(values):
+    """Return values with narrow integer and float dtypes widened to 64 bits
+
+    Compacted frames store small numbers as int8/float32, and arithmetic keeps the operand
+    dtype, so results would otherwise wrap around or lose precision.
+    """
+    if not isinstance(values, pd.Series):
+        return values
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in "iu" and dtype.itemsize < 8:
+            return values.astype(np.int64)
+        if dtype.kind == "f" and dtype.itemsize < 8:
+            return values.astype(np.float64)
+    elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in "iuf" and dtype.itemsize < 8:
+        return values.astype("Float64" if dtype.kind == "f" else "Int64")
+    return values
+
+def _boolean_series(values):
+    """Return a Series of True/False values (possibly with missing ones) as a boolean Series, else None"""
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return values
+    # e.g. .str.contains() on an object column with missing values
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ("boolean", "empty"):
+        return values.astype("boolean")
+    return None
+
+def _truth(values):
+    """Return values as booleans if they are True/False values, for not/and/or"""
+    if isinstance(values, pd.Series):
+        values = _boolean_series(values)
+        if values is not None:
+            return values
+    elif isinstance(values, (bool, np.bool_)):
+        return np.bool_(values)
+    raise ExpressionError("not, and and or need True/False values, e.g. Stock > 0 and not isna(Price)")
+
+def _logical(function):
+    return lambda *operands: function(*(_truth(operand) for operand in operands))
+
+def _arithmetic(function):
+    return lambda *operands: function(*(widen_numeric(operand) for operand in operands))
+
+def _is_text(values):
+    if isinstance(values, pd.Series):
+        return values.dtype == object or isinstance(values.dtype, (pd.StringDtype, pd.CategoricalDtype))
+    return isinstance(values, str)
+
+def _multiply(left, right):
+    # Multiplying text (or lists from .str.split) repeats it, which can exhaust memory
+    if _is_text(left) or _is_text(right):
+        raise ExpressionError("Text can't be multiplied; convert it with to_numeric() first")
+    return operator.mul(widen_numeric(left), widen_numeric(right))
+
+BINARY_OPERATORS = {
+    ast.Add: _arithmetic(operator.add), ast.Sub: _arithmetic(operator.sub), ast.Mult: _multiply,
+    ast.Div: _arithmetic(operator.truediv), ast.FloorDiv: _arithmetic(operator.floordiv),
+    ast.Mod: _arithmetic(operator.mod), ast.Pow: _arithmetic(operator.pow),
+    ast.BitAnd: operator.and_, ast.BitOr: operator.or_
+}
+UNARY_OPERATORS = {ast.USub: _arithmetic(operator.neg), ast.UAdd: operator.pos, ast.Not: _logical(operator.invert), ast.Invert: operator.invert}
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge
+}
+
+def _where(condition, if_true, if_false):
+    """Pick if_true where condition holds and if_false elsewhere (missing conditions count as False)"""
+    if isinstance(condition, pd.Series):
+        values = np.where(condition.to_numpy(dtype=bool, na_value=False), if_true, if_false)
+        return pd.Series(values, index=condition.index)
+    return if_true if condition else if_false
+
+# Functions callable by name, e.g. sqrt(Price) or where(Stock > 0, Price, 0)
+FUNCTIONS = {
+    "abs": np.abs, "sqrt": np.sqrt, "log": np.log, "log10": np.log10, "log2": np.log2, "exp": np.exp,
+    "floor": np.floor, "ceil": np.ceil, "round": np.round, "sign": np.sign,
+    "maximum": np.maximum, "minimum": np.minimum, "where": _where,
+    "isna": pd.isna, "notna": pd.notna, "isnull": pd.isna, "notnull": pd.notna,
+    "to_numeric": lambda values: pd.to_numeric(values, errors="coerce"),
+    "to_datetime": lambda values: pd.to_datetime(values, errors="coerce")
+}
+# numpy functions also accepted as np.<name>(...)
+NUMPY_FUNCTIONS = {
+    "abs", "sqrt", "log", "log10", "log2", "exp", "floor", "ceil", "round", "sign",
+    "maximum", "minimum", "where", "isnan"
+}
+# Methods callable on a column, e.g. Price.fillna(0) or df['Name'].str.lower()
+SERIES_METHODS = {"abs", "round", "fillna", "isna", "notna", "isnull", "notnull", "between", "isin", "clip"}
+STR_METHODS = {
+    "lower", "upper", "title", "capitalize", "strip", "lstrip", "rstrip", "len", "contains",
+    "startswith", "endswith", "replace", "slice", "zfill", "pad", "split", "get", "cat"
+}
+DT_METHODS = {"strftime", "floor", "ceil", "round", "normalize", "day_name", "month_name"}
+DT_ATTRIBUTES = {
+    "year", "month", "day", "hour", "minute", "second", "dayofweek", "weekday",
+    "dayofyear", "quarter", "date", "is_month_start", "is_month_end"
+}
+
+def _text_width(value):
+    """Check a width or position argument of a .str method"""
+    if value is None:
+        return
+    if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, np.integer)) or abs(value) > MAX_TEXT_WIDTH:
+        raise ExpressionError(f"Text widths and positions must be whole numbers up to {MAX_TEXT_WIDTH:,}")
+
+def _str_pad(values, width, *args, **kwargs):
+    _text_width(width)
+    return values.str.pad(width, *args, **kwargs)
+
+def _str_zfill(values, width):
+    _text_width(width)
+    return values.str.zfill(width)
+
+def _str_slice(values, start=None, stop=None, step=None):
+    for value in (start, stop, step):
+        _text_width(value)
+    return values.str.slice(start, stop, step)
+
+def _str_cat(values, others=None, sep=None, **kwargs):
+    # Without others, cat joins the whole column into one string that would then be repeated on every row
+    if others is None:
+        raise ExpressionError(".str.cat() needs the values to append, e.g. First.str.cat(Last, sep=' ')")
+    if sep is not None and len(sep) > MAX_TEXT_WIDTH:
+        raise ExpressionError(f"Separators are limited to {MAX_TEXT_WIDTH:,} characters")
+    return values.str.cat(others, sep=sep, **kwargs)
+
+# Patterns are matched as plain text: user regular expressions could backtrack for a very long time
+def _literal_pattern(regex):
+    if regex:
+        raise ExpressionError("Regular expressions are not allowed; patterns are matched as plain text")
+
+def _str_contains(values, pat, case=True, na=None, regex=False):
+    _literal_pattern(regex)
+    return values.str.contains(pat, case=case, na=na, regex=False)
+
+def _str_split(values, pat=None, n=-1, expand=False, regex=False):
+    _literal_pattern(regex)
+    return values.str.split(pat, n=n, expand=expand, regex=False)
+
+def _str_replace(values, pat, repl, n=-1, regex=False):
+    _literal_pattern(regex)
+    if not isinstance(pat, str) or not isinstance(repl, str) or not pat:
+        raise ExpressionError(".str.replace() needs a non-empty text pattern and a text replacement")
+    if len(repl) > len(pat):
+        # Check what the replacement adds to each row before building it
+        matches = values.str.count(re.escape(pat))
+        if n >= 0:
+            matches = matches.clip(upper=n)
+        if matches.max() * (len(repl) - len(pat)) > MAX_TEXT_WIDTH:
+            raise ExpressionError(f".str.replace() may add at most {MAX_TEXT_WIDTH:,} characters to a row")
+    return values.str.replace(pat, repl, n=n, regex=False)
+
+# .str methods whose arguments are checked before the call
+CHECKED_STR_METHODS = {
+    "pad": _str_pad, "zfill": _str_zfill, "slice": _str_slice, "cat": _str_cat,
+    "contains": _str_contains, "split": _str_split, "replace": _str_replace
+}
+
+def _method(name):
+    return lambda values, *args, **kwargs: getattr(values, name)(*args, **kwargs)
+
+def _accessor_method(accessor, name):
+    return lambda values, *args, **kwargs: getattr(getattr(values, accessor), name)(*args, **kwargs)
+
+def _accessor_attribute(accessor, name):
+    return lambda values: getattr(getattr(values, accessor), name)
+
+def _isin(values, choices, negate=False):
+    result = values.isin(choices) if isinstance(values, pd.Series) else values in choices
+    return ~result if negate else result
+
+class CompiledExpression:
+    """A checked expression compiled into steps that each compute one distinct subexpression"""
+
+    def __init__(self, text, steps, result, columns):
+        self.text = text
+        self.columns = columns
+        self._steps = steps
+        self._result = result
+        # Intermediate results are released after their last use
+        last_use = {}
+        for i, step in enumerate(steps):
+            if step[0] == "call":
+                for slot in (*step[2], *step[3].values()):
+                    last_use[slot] = i
+        self._release = [[] for _ in steps]
+        for slot, i in last_use.items():
+            if slot != result:
+                self._release[i].append(slot)
+
+    def evaluate(self, df):
+        """Evaluate the expression over df, returning a Series (or a scalar for column-free expressions)"""
+        values = [None] * len(self._steps)
+        for i, step in enumerate(self._steps):
+            kind = step[0]
+            if kind == "column":
+                values[i] = df[step[1]]
+            elif kind == "constant":
+                values[i] = step[1]
+            else:
+                _, function, args, kwargs = step
+                values[i] = function(*(values[slot] for slot in args), **{key: values[slot] for key, slot in kwargs.items()})
+            for slot in self._release[i]:
+                values[slot] = None
+        return values[self._result]
+
+class _Compiler:
+    """Turns a parsed expression into steps, sharing repeated subexpressions"""
+
+    def __init__(self, schema):
+        self.schema = None if schema is None else dict(schema)
+        self.steps = []
+        self.slots = {}
+        self.columns = []
+
+    def add(self, key, step):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.steps)
+            self.steps.append(step)
+            self.slots[key] = slot
+        return slot
+
+    def column(self, name):
+        if self.schema is not None and name not in self.schema:
+            raise ExpressionError(f"Unknown column '{name}'")
+        if name not in self.columns:
+            self.columns.append(name)
+        return self.add(("column", name), ("column", name))
+
+    def constant(self, value):
+        key = tuple(value) if isinstance(value, list) else value
+        return self.add(("constant", type(value).__name__, key), ("constant", value))
+
+    def call(self, name, function, args, kwargs=None):
+        kwargs = kwargs or {}
+        return self.add(("call", name, tuple(args), tuple(sorted(kwargs.items()))), ("call", function, args, kwargs))
+
+    def compile(self, node):
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body)
+        if isinstance(node, ast.Constant):
+            return self.constant(self.literal(node))
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return self.constant([self.literal(element) for element in node.elts])
+        if isinstance(node, ast.Name):
+            if node.id == "df":
+                raise ExpressionError("Use df['column'] to refer to a column; df on its own is not allowed")
+            return self.column(node.id)
+        if isinstance(node, ast.Subscript):
+            return self.column(self.column_name(node))
+        if isinstance(node, ast.Attribute):
+            return self.attribute(node)
+        if isinstance(node, ast.BinOp):
+            return self.binary(node)
+        if isinstance(node, ast.UnaryOp):
+            if type(node.op) not in UNARY_OPERATORS:
+                raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+            return self.call(type(node.op).__name__, UNARY_OPERATORS[type(node.op)], [self.compile(node.operand)])
+        if isinstance(node, ast.BoolOp):
+            # and/or combine whole columns element by element
+            combine = _logical(operator.and_ if isinstance(node.op, ast.And) else operator.or_)
+            slot = self.compile(node.values[0])
+            for value in node.values[1:]:
+                slot = self.call(type(node.op).__name__, combine, [slot, self.compile(value)])
+            return slot
+        if isinstance(node, ast.Compare):
+            return self.compare(node)
+        if isinstance(node, ast.Call):
+            return self.function_call(node)
+        raise ExpressionError(f"{type(node).__name__} is not allowed in expressions")
+
+    def literal(self, node):
+        """Return the value of a constant node, with numbers as numpy scalars
+
+        True/False stay Python bools, which pandas options such as na= and expand= require.
+        """
+        if not isinstance(node, ast.Constant):
+            raise ExpressionError("Lists may only contain constants")
+        value = node.value
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int):
+            try:
+                return np.int64(value)
+            except OverflowError:
+                raise ExpressionError(f"Integer {value} is too large")
+        if isinstance(value, float):
+            return np.float64(value)
+        if value is None or isinstance(value, str):
+            return value
+        raise ExpressionError(f"Constant {value!r} is not allowed")
+
+    def column_name(self, node):
+        """Return the column named by df['name'] (or col('name'))"""
+        if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df"
+                and isinstance(node.slice, ast.Constant)):
+            return node.slice.value
+        raise ExpressionError("Only df['column'] subscripts are allowed")
+
+    def attribute(self, node):
+        receiver = node.value
+        if isinstance(receiver, ast.Name) and receiver.id == "df":
+            return self.column(node.attr)
+        if isinstance(receiver, ast.Attribute) and receiver.attr == "dt" and node.attr in DT_ATTRIBUTES:
+            values = self.accessor_receiver(receiver)
+            return self.call(f"dt.{node.attr}", _accessor_attribute("dt", node.attr), [values])
+        raise ExpressionError(f"Attribute '{node.attr}' is not allowed")
+
+    def accessor_receiver(self, node):
+        """Compile the column under a .str or .dt accessor, checking its type when it is a plain column"""
+        slot = self.compile(node.value)
+        step = self.steps[slot]
+        if step[0] == "column" and self.schema is not None:
+            dtype = self.schema[step[1]]
+            if node.attr == "dt" and not dtype.startswith("datetime"):
+                raise ExpressionError(f"Column '{step[1]}' is not a datetime column")
+            if node.attr == "str" and dtype not in ("object", "string", "str", "category"):
+                raise ExpressionError(f"Column '{step[1]}' is not a text column")
+        return slot
+
+    def binary(self, node):
+        if type(node.op) not in BINARY_OPERATORS:
+            raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        for operand in (node.left, node.right):
+            # Repeating literal strings or lists could build arbitrarily large values
+            if isinstance(operand, (ast.List, ast.Tuple, ast.Set)) or (
+                    isinstance(node.op, ast.Mult) and isinstance(operand, ast.Constant) and isinstance(operand.value, str)):
+                raise ExpressionError("Strings and lists can't be repeated or combined with arithmetic")
+        return self.call(
+            type(node.op).__name__, BINARY_OPERATORS[type(node.op)],
+            [self.compile(node.left), self.compile(node.right)]
+        )
+
+    def compare(self, node):
+        # a < b < c means (a < b) & (b < c)
+        result = None
+        left = self.compile(node.left)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = self.compile(comparator)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                negate = isinstance(op, ast.NotIn)
+                slot = self.call(type(op).__name__, lambda values, choices, negate=negate: _isin(values, choices, negate), [left, right])
+            elif type(op) in COMPARISON_OPERATORS:
+                slot = self.call(type(op).__name__, COMPARISON_OPERATORS[type(op)], [left, right])
+            else:
+                raise ExpressionError(f"Comparison {type(op).__name__} is not allowed")
+            result = slot if result is None else self.call("And", operator.and_, [result, slot])
+            left = right
+        return result
+
+    def function_call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "col":
+            if len(node.args) != 1 or node.keywords or not isinstance(node.args[0], ast.Constant):
+                raise ExpressionError("col() takes a single column name")
+            return self.column(node.args[0].value)
+
+        if isinstance(func, ast.Name) and func.id in FUNCTIONS:
+            name, function, receiver = func.id, FUNCTIONS[func.id], []
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "np":
+            if func.attr not in NUMPY_FUNCTIONS:
+                raise ExpressionError(f"np.{func.attr} is not allowed")
+            name, function, receiver = f"np.{func.attr}", getattr(np, func.attr), []
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Attribute) and func.value.attr in ("str", "dt"):
+            accessor = func.value.attr
+            if func.attr not in (STR_METHODS if accessor == "str" else DT_METHODS):
+                raise ExpressionError(f".{accessor}.{func.attr}() is not allowed")
+            name = f"{accessor}.{func.attr}"
+            function = CHECKED_STR_METHODS.get(func.attr) if accessor == "str" else None
+            function = function or _accessor_method(accessor, func.attr)
+            receiver = [self.accessor_receiver(func.value)]
+        elif isinstance(func, ast.Attribute) and func.attr in SERIES_METHODS:
+            name, function, receiver = f".{func.attr}", _method(func.attr), [self.compile(func.value)]
+        else:
+            described = func.id if isinstance(func, ast.Name) else getattr(func, "attr", type(func).__name__)
+            raise ExpressionError(f"Function '{described}' is not allowed")
+
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(kw.arg is None for kw in node.keywords):
+            raise ExpressionError("* and ** arguments are not allowed")
+        args = receiver + [self.compile(arg) for arg in node.args]
+        kwargs = {kw.arg: self.compile(kw.value) for kw in node.keywords}
+        return self.call(name, function, args, kwargs)
+
+@lru_cache(maxsize=256)
+def compile_expression(text, schema=None):
+    """Parse and check an expression, returning a CompiledExpression (cached per text and schema)
+
+    schema is a tuple of (column, dtype name) pairs as returned by frame_schema(); without it
+    column names and types are not checked.
+    """
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expressions are limited to {MAX_EXPRESSION_LENGTH:,} characters")
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise ExpressionError("Expression is nested too deeply")
+    compiler = _Compiler(schema)
+    try:
+        result = compiler.compile(tree)
+    except RecursionError:
+        raise ExpressionError("Expression is nested too deeply")
+    return CompiledExpression(text, compiler.steps, result, tuple(compiler.columns))
+
+def frame_schema(df):
+    """Return the (column, dtype name) pairs expressions are compiled against"""
+    return tuple((col, str(dtype)) for col, dtype in df.dtypes.items())
+
+def expression_columns(text):
+    """Return the columns an expression reads"""
+    return compile_expression(text).columns
+
+def evaluate_expression(text, df):
+    """Evaluate an expression over df"""
+    return compile_expression(text, frame_schema(df)).evaluate(df)
+
+def filter_mask(text, df):
+    """Evaluate a row filter expression over df, returning a boolean array (missing results drop the row)"""
+    result = evaluate_expression(text, df)
+    if isinstance(result, pd.Series):
+        result = _boolean_series(result)
+    if result is None or not isinstance(result, pd.Series):
+        raise ExpressionError("A filter expression must give True or False for every row, e.g. Age > 30")
+    return result.to_numpy(dtype=bool, na_value=False)
@@ -3,12 +3,38 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
+import re
+import hashlib
+import importlib.util
+import threading
+import time
+import gzip
+import lzma
+import bz2
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import openpyxl
 import plotly.express as px
 import plotly.graph_objects as go
-from io import BytesIO
-import base64
+from plotly.subplots import make_subplots
+from io import BufferedIOBase, BytesIO, TextIOWrapper
 from streamlit_option_menu import option_menu
-import time
+from cleaning import (
+    RowHashIndex,
+    apply_operations,
+    chunk_reader,
+    STREAMABLE_EXTENSIONS,
+    describe_operation,
+    iter_file_chunks,
+    make_working_copy,
+    project_operations,
+    read_excel_bytes,
+    read_file_columns,
+    recipe_to_json,
+    stream_operations_to_file
+)
+from expressions import ExpressionError, compile_expression, expression_columns, filter_mask
 
 # Configure the Streamlit app's appearance and layout
 st.set_page_config(
@@ -262,25 +288,6 @@ st.markdown(
             background-color: var(--primary-color);
             color: white;
         }
-        
-        /* Custom download button */
-        .download-btn {
-            display: inline-block;
-            background-color: var(--success-color);
-            color: white;
-            padding: 0.5rem 1rem;
-            border-radius: var(--border-radius);
-            text-decoration: none;
-            font-weight: 600;
-            margin-top: 1rem;
-            transition: all 0.3s ease;
-        }
-        
-        .download-btn:hover {
-            background-color: #3da5d9;
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.15);
-        }
     </style>
     """,
     unsafe_allow_html=True
@@ -295,31 +302,669 @@ def get_file_size_display(size_bytes):
         size_bytes /= 1024.0
     return f"{size_bytes:.2f} TB"
 
-def get_download_link(df, filename, file_format):
-    """Generate a download link for the dataframe"""
+# Number of CSV rows parsed per chunk during upload
+CSV_CHUNK_ROWS = 100_000
+
+# Upper bound on files parsed at the same time
+INGEST_MAX_WORKERS = os.cpu_count() or 1
+
+def read_uploaded_file(file, file_extension, progress_callback=None, excel_pool=None, **read_options):
+    """Parse an uploaded file, reporting the fraction of bytes consumed so far
+
+    Excel parsing holds the GIL, so workbooks are handed to excel_pool (a process pool) when given.
+    """
+    file.seek(0)
+    total_bytes = getattr(file, "size", 0) or 1
+
+    if file_extension == ".csv":
+        chunks = []
+        with pd.read_csv(file, chunksize=CSV_CHUNK_ROWS, **read_options) as reader:
+            for chunk in reader:
+                chunks.append(chunk)
+                if progress_callback:
+                    progress_callback(min(file.tell() / total_bytes, 1.0))
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    elif file_extension in [".xlsx", ".xls"]:
+        # Excel workbooks are parsed in a single pass
+        if excel_pool is not None:
+            df = excel_pool.submit(read_excel_bytes, file.getvalue(), **read_options).result()
+        else:
+            df = pd.read_excel(file, **read_options)
+    elif file_extension == ".parquet":
+        df = pd.read_parquet(file, **read_options)
+    elif file_extension in [".feather", ".arrow"]:
+        # Feather v2 is the Arrow IPC file format
+        df = pd.read_feather(file, **read_options)
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+    if progress_callback:
+        progress_callback(1.0)
+    return df
+
+def list_excel_sheets(content):
+    """Return (name, rows, columns) for each sheet of an .xlsx workbook without parsing cell data"""
+    # Read-only mode streams the workbook and takes dimensions from each sheet's header
+    workbook = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True, keep_links=False)
+    try:
+        return [(sheet.title, sheet.max_row, sheet.max_column) for sheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+# Server directory holding files too large to upload; enables out-of-core mode when set
+OUT_OF_CORE_DATA_DIR = os.environ.get("DATA_SWEEPER_DATA_DIR")
+OUT_OF_CORE_OUTPUT_DIR = os.environ.get(
+    "DATA_SWEEPER_OUTPUT_DIR",
+    os.path.join(OUT_OF_CORE_DATA_DIR, "cleaned") if OUT_OF_CORE_DATA_DIR else None
+)
+
+# Rows of an out-of-core file loaded into memory for preview and cleaning
+OUT_OF_CORE_SAMPLE_ROWS = 10_000
+
+# Convert formats an out-of-core export can be streamed to
+OUT_OF_CORE_OUTPUT_EXTENSIONS = {"CSV": ".csv", "Parquet": ".parquet", "Feather": ".feather", "Arrow IPC": ".arrow"}
+
+def show_out_of_core_notice(file_info):
+    """Explain that an out-of-core file is shown through an in-memory sample"""
+    if "source_path" in file_info:
+        st.info(
+            f"📦 Out-of-core file: showing the first {len(file_info['data']):,} rows. "
+            "Cleaning steps are recorded and applied to the whole file, chunk by chunk, when exporting from Convert."
+        )
+
+# Object columns with at most this ratio of unique values are stored as categories
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+def get_frame_memory_usage(df):
+    """Return the deep memory footprint of a dataframe in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+def compact_dataframe(df):
+    """Downcast numeric columns and encode text columns with compact dtypes"""
+    has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+    compacted = {}
+
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+
+        if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+            downcast = pd.to_numeric(series, downcast='integer')
+            if downcast.dtype != dtype:
+                compacted[col] = downcast
+        elif pd.api.types.is_float_dtype(dtype) and dtype == np.float64:
+            # Only downcast floats when float32 represents every value exactly
+            as_float32 = series.astype(np.float32)
+            if np.array_equal(as_float32.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+                compacted[col] = as_float32
+        elif (dtype == object or isinstance(dtype, pd.StringDtype)) and len(series) > 0:
+            try:
+                unique_ratio = series.nunique(dropna=True) / len(series)
+            except TypeError:
+                # Lists or dicts (common in Parquet files) can't be counted or used as categories
+                continue
+            if unique_ratio <= CATEGORY_MAX_UNIQUE_RATIO:
+                compacted[col] = series.astype('category')
+            elif dtype == object and has_pyarrow and pd.api.types.infer_dtype(series, skipna=True) == "string":
+                compacted[col] = series.astype(pd.StringDtype("pyarrow"))
+
+    if not compacted:
+        return df
+    # Every replacement changes the dtype, so a shallow copy never writes into df's buffers
+    df = df.copy(deep=False)
+    for col, values in compacted.items():
+        df[col] = values
+    return df
+
+# Limits for the parse cache shared by all sessions, overridable through the environment
+PARSE_CACHE_MAX_ENTRIES = int(os.environ.get("DATA_SWEEPER_PARSE_CACHE_ENTRIES", 16))
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("DATA_SWEEPER_PARSE_CACHE_MB", 1024)) * 1024 * 1024
+
+class SizedLRUCache:
+    """LRU cache bounded by entry count and total size, used for parsed frames and figures"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (value, metadata) for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[2]
+
+    def put(self, key, value, size, metadata=None):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, metadata)
+            self.total_bytes += size
+            # Evict least recently used entries until both limits hold
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def discard(self, predicate):
+        """Remove every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+@st.cache_resource
+def get_parse_cache():
+    """Return the process-wide parse cache shared across sessions"""
+    return SizedLRUCache(PARSE_CACHE_MAX_ENTRIES, PARSE_CACHE_MAX_BYTES)
+
+def hash_uploaded_file(file):
+    """Return a hex digest of the uploaded file's contents"""
+    with file.getbuffer() as view:
+        return hashlib.blake2b(view, digest_size=16).hexdigest()
+
+def load_uploaded_file(file, file_extension, progress_callback=None, compact=False, cache=None, excel_pool=None,
+                       **read_options):
+    """Parse an uploaded file through the parse cache; returns (df, metadata, cache_hit)
+
+    Pass cache when calling from a worker thread, which cannot look up Streamlit resources.
+    """
+    content_hash = hash_uploaded_file(file)
+    cache_key = (content_hash, file_extension, compact, tuple(sorted(read_options.items())))
+    cache = cache or get_parse_cache()
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        if progress_callback:
+            progress_callback(1.0)
+        df, metadata = cached
+        return df, metadata, True
+
+    df = read_uploaded_file(file, file_extension, progress_callback, excel_pool, **read_options)
+    memory_before = get_frame_memory_usage(df)
+    if compact:
+        df = compact_dataframe(df)
+        memory_after = get_frame_memory_usage(df)
+    else:
+        memory_after = memory_before
+
+    metadata = {
+        "hash": content_hash,
+        "memory_before": memory_before,
+        "memory_after": memory_after
+    }
+    cache.put(cache_key, df, memory_after, metadata)
+    return df, metadata, False
+
+# File extension and MIME type of each Convert output format
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "JSON": ("json", "application/json"),
+    "HTML": ("html", "text/html"),
+    "Markdown": ("md", "text/markdown"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Feather": ("feather", "application/vnd.apache.arrow.file"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file")
+}
+
+# Formats that are plain text and worth compressing (the others are compressed internally or binary)
+COMPRESSIBLE_FORMATS = ["CSV", "JSON", "HTML", "Markdown"]
+
+# File extension and MIME type of each compressed output
+COMPRESSION_FORMATS = {
+    "gzip": ("gz", "application/gzip"),
+    "zip": ("zip", "application/zip"),
+    "bz2": ("bz2", "application/x-bzip2"),
+    "xz": ("xz", "application/x-xz")
+}
+
+# gzip and xz blocks are compressed independently on a thread pool and concatenated
+PARALLEL_COMPRESSORS = {
+    "gzip": lambda block: gzip.compress(block, compresslevel=6, mtime=0),
+    "xz": lambda block: lzma.compress(block)
+}
+COMPRESSION_BLOCK_BYTES = 4 * 1024 * 1024
+COMPRESSION_WORKERS = os.cpu_count() or 1
+
+class CompressedWriter(BufferedIOBase):
+    """Binary file object that compresses everything written to it into another file object
+
+    gzip and xz input is cut into blocks that are compressed in parallel (zlib and lzma
+    release the GIL) and written out in order as a multi-member stream, which gunzip, xz
+    and Python's gzip/lzma modules read as a single file. bz2 and zip compress serially.
+    """
+
+    def __init__(self, output, compression, archive_name=None,
+                 block_bytes=COMPRESSION_BLOCK_BYTES, workers=COMPRESSION_WORKERS):
+        self.output = output
+        self.compression = compression
+        self.block_bytes = block_bytes
+        self.workers = workers
+        self.bytes_in = 0
+        self._pending = bytearray()
+        self._blocks_written = 0
+
+        if compression in PARALLEL_COMPRESSORS:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+            self._in_flight = deque()
+        elif compression == "bz2":
+            self._compressor = bz2.BZ2Compressor()
+        elif compression == "zip":
+            self._archive = zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED)
+            self._entry = self._archive.open(archive_name, "w", force_zip64=True)
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        size = len(data)
+        self.bytes_in += size
+        if self.compression in PARALLEL_COMPRESSORS:
+            self._pending += data
+            while len(self._pending) >= self.block_bytes:
+                self._submit(bytes(self._pending[:self.block_bytes]))
+                del self._pending[:self.block_bytes]
+        elif self.compression == "bz2":
+            self.output.write(self._compressor.compress(data))
+        else:
+            self._entry.write(data)
+        return size
+
+    def _submit(self, block):
+        self._in_flight.append(self._executor.submit(PARALLEL_COMPRESSORS[self.compression], block))
+        self._blocks_written += 1
+        # Bound the memory held by finished-but-unwritten blocks
+        while len(self._in_flight) > 2 * self.workers:
+            self.output.write(self._in_flight.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.compression in PARALLEL_COMPRESSORS:
+                # An empty export still needs one member to be a valid file
+                if self._pending or not self._blocks_written:
+                    self._submit(bytes(self._pending))
+                    self._pending.clear()
+                while self._in_flight:
+                    self.output.write(self._in_flight.popleft().result())
+                self._executor.shutdown()
+            elif self.compression == "bz2":
+                self.output.write(self._compressor.flush())
+            else:
+                self._entry.close()
+                self._archive.close()
+        finally:
+            super().close()
+
+# Rows converted to Python values at a time when streaming a sheet into a workbook
+EXCEL_CHUNK_ROWS = 10_000
+EXCEL_MAX_ROWS = 1_048_576
+
+def excel_sheet_names(file_names):
+    """Map file names to unique, valid Excel sheet names"""
+    sheet_names = {}
+    used = set()
+    for file_name in file_names:
+        # Sheet names are at most 31 characters and cannot contain : * ? / \ [ ]
+        base = re.sub(r"\.(csv|xlsx|xls|parquet|feather|arrow)\b", "", file_name, flags=re.IGNORECASE)
+        base = re.sub(r"[:*?/\\]", "_", base.replace("[", "(").replace("]", ")")).strip() or "Sheet"
+        name = base[:31]
+        suffix = 2
+        while name.lower() in used:
+            name = f"{base[:31 - len(str(suffix)) - 3]} ({suffix})"
+            suffix += 1
+        used.add(name.lower())
+        sheet_names[file_name] = name
+    return sheet_names
+
+def write_excel(sheets, output, include_index=False):
+    """Stream {sheet name: dataframe} into an .xlsx workbook with openpyxl's write-only mode
+
+    Rows are appended chunk by chunk and spooled to disk by openpyxl, so memory stays bounded
+    instead of holding a cell object for every value.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        if len(df) + 1 > EXCEL_MAX_ROWS:
+            raise ValueError(f"{sheet_name} has {len(df):,} rows; Excel sheets hold at most {EXCEL_MAX_ROWS - 1:,}")
+        if include_index:
+            df = df.reset_index()
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append([str(col) for col in df.columns])
+        for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXCEL_CHUNK_ROWS]
+            # Missing values become empty cells
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                worksheet.append(row)
+    workbook.save(output)
+
+def write_export(df, file_format, output, include_index=False):
+    """Serialize the dataframe straight into a binary file object"""
     if file_format == "CSV":
-        csv = df.to_csv(index=False)
-        b64 = base64.b64encode(csv.encode()).decode()
-        href = f'data:text/csv;base64,{b64}'
-        ext = 'csv'
+        df.to_csv(output, index=include_index)
     elif file_format == "Excel":
-        buffer = BytesIO()
-        df.to_excel(buffer, index=False)
-        buffer.seek(0)
-        b64 = base64.b64encode(buffer.read()).decode()
-        href = f'data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}'
-        ext = 'xlsx'
+        write_excel({"Sheet1": df}, output, include_index)
     elif file_format == "JSON":
-        json_str = df.to_json(orient='records')
-        b64 = base64.b64encode(json_str.encode()).decode()
-        href = f'data:application/json;base64,{b64}'
-        ext = 'json'
-    
+        # Records carry no index, so an included index becomes a field of each record
+        (df.reset_index() if include_index else df).to_json(output, orient='records')
+    elif file_format in ["HTML", "Markdown"]:
+        # These writers produce text, which is encoded as it is written
+        text_output = TextIOWrapper(output, encoding="utf-8")
+        if file_format == "HTML":
+            df.to_html(text_output, index=include_index)
+        else:
+            df.to_markdown(text_output, index=include_index)
+        text_output.flush()
+        text_output.detach()
+    elif file_format == "Parquet":
+        df.to_parquet(output, index=include_index)
+    elif file_format in ["Feather", "Arrow IPC"]:
+        # Feather needs a default index; both formats are written as an Arrow IPC file
+        df.reset_index(drop=not include_index).to_feather(output)
+    else:
+        raise ValueError(f"Unsupported output format: {file_format}")
+
+def get_download_file(df, filename, file_format, include_index=False, compression=None):
+    """Serialize the dataframe for st.download_button; returns (data, file name, MIME type, report)
+
+    report holds the uncompressed and written sizes in bytes and the time taken.
+    """
+    ext, mime = EXPORT_FORMATS[file_format]
     download_filename = filename.split('.')[0] + f'.{ext}'
-    return f'<a href="{href}" class="download-btn" download="{download_filename}">⬇️ Download {file_format}</a>'
+    buffer = BytesIO()
+    started = time.perf_counter()
+
+    if compression:
+        writer = CompressedWriter(buffer, compression, archive_name=download_filename)
+        write_export(df, file_format, writer, include_index)
+        writer.close()
+        bytes_in = writer.bytes_in
+        compressed_ext, mime = COMPRESSION_FORMATS[compression]
+        # A zip archive holds the file under its own name (data.zip); the others wrap it (data.csv.gz)
+        if compression == "zip":
+            download_filename = filename.split('.')[0]
+        download_filename += f'.{compressed_ext}'
+    else:
+        write_export(df, file_format, buffer, include_index)
+        bytes_in = buffer.tell()
+
+    data = buffer.getvalue()
+    report = {"bytes_in": bytes_in, "bytes_out": len(data), "seconds": time.perf_counter() - started}
+    return data, download_filename, mime, report
+
+def get_workbook_download_file(frames, filename, include_index=False):
+    """Write {file name: dataframe} as the sheets of one workbook; returns (data, file name, MIME type, report)"""
+    sheet_names = excel_sheet_names(frames)
+    buffer = BytesIO()
+    started = time.perf_counter()
+    write_excel({sheet_names[name]: df for name, df in frames.items()}, buffer, include_index)
+    data = buffer.getvalue()
+    report = {"bytes_in": len(data), "bytes_out": len(data), "seconds": time.perf_counter() - started}
+    return data, filename, EXPORT_FORMATS["Excel"][1], report
+
+def get_data_version(file_name):
+    """Return the version counter of a file's processed data"""
+    return st.session_state.data_versions.get(file_name, 0)
+
+def get_frame_stats(file_name, df, kind="processed"):
+    """Return cached per-column null counts, row hashes and the duplicate count for a file's frame
 
-def create_file_stats_cards(df):
+    kind is "original" for the immutable uploaded frame or "processed" for the cleaned one;
+    processed statistics are only valid for the data version they were computed at.
+    """
+    version = get_data_version(file_name) if kind == "processed" else 0
+    key = (file_name, kind)
+    stats = st.session_state.frame_stats.get(key)
+
+    if stats is None or stats["version"] != version:
+        stats = {
+            "version": version,
+            "null_counts": df.isna().sum(),
+            "row_hashes": RowHashIndex(),
+            "duplicates": None
+        }
+        st.session_state.frame_stats[key] = stats
+    if stats["duplicates"] is None:
+        stats["duplicates"] = int(stats["row_hashes"].duplicated(df).sum())
+    return stats
+
+def get_current_stats(file_name):
+    """Return the cached statistics of a file's processed data if they match its version"""
+    stats = st.session_state.frame_stats.get((file_name, "processed"))
+    if stats is not None and stats["version"] == get_data_version(file_name):
+        return stats
+    return None
+
+def commit_processed_data(file_name, df, stats=None):
+    """Store the result of a cleaning operation and bump the file's data version
+
+    stats are the statistics carried forward by apply_operations(); without them the
+    new version's statistics are rescanned on first use.
+    """
+    new_version = get_data_version(file_name) + 1
+    st.session_state.processed_data[file_name] = df
+    st.session_state.data_versions[file_name] = new_version
+
+    if stats is not None:
+        st.session_state.frame_stats[(file_name, "processed")] = {**stats, "version": new_version}
+    else:
+        st.session_state.frame_stats.pop((file_name, "processed"), None)
+
+def submit_cleaning_operation(file_name, df, operation):
+    """Apply a cleaning operation now, or queue it when deferred mode is on"""
+    pending = st.session_state.pending_operations
+    # Anything still queued must run first, so later operations join the queue too
+    if st.session_state.get("deferred_cleaning") or pending.get(file_name):
+        pending.setdefault(file_name, []).append(operation)
+        return
+    df, stats = apply_operations(df, [operation], get_current_stats(file_name))
+    commit_processed_data(file_name, df, stats)
+    st.session_state.cleaning_history.setdefault(file_name, []).append(operation)
+
+def get_processed_data(file_name):
+    """Return a file's processed frame, first running any queued cleaning operations"""
+    if file_name not in st.session_state.processed_data:
+        st.session_state.processed_data[file_name] = make_working_copy(get_original_data(file_name))
+    df = st.session_state.processed_data[file_name]
+
+    pending = st.session_state.pending_operations.get(file_name)
+    if pending:
+        try:
+            df, stats = apply_operations(df, pending, get_current_stats(file_name))
+        except Exception as e:
+            st.error(f"❌ Error running queued cleaning operations: {str(e)}")
+            return df
+        commit_processed_data(file_name, df, stats)
+        st.session_state.cleaning_history.setdefault(file_name, []).extend(pending)
+        del st.session_state.pending_operations[file_name]
+    return df
+
+def register_workbook(file, compact=False):
+    """Index the sheets of an uploaded .xlsx workbook and open its first sheet without parsing it"""
+    content = file.getvalue()
+    sheets = list_excel_sheets(content)
+    st.session_state.workbooks[file.name] = {
+        "hash": hash_uploaded_file(file),
+        "content": content,
+        "size": file.size,
+        "sheets": sheets,
+        "compact": compact
+    }
+    if sheets:
+        open_workbook_sheet(file.name, sheets[0][0])
+
+def open_workbook_sheet(workbook_name, sheet_name):
+    """Add a workbook sheet to the file list; its data is parsed on first access"""
+    workbook = st.session_state.workbooks[workbook_name]
+    file_name = workbook_name if len(workbook["sheets"]) == 1 else f"{workbook_name} [{sheet_name}]"
+    if file_name not in st.session_state.files:
+        st.session_state.files[file_name] = {
+            "data": None,
+            "size": workbook["size"],
+            "type": ".xlsx",
+            "workbook": workbook_name,
+            "sheet": sheet_name
+        }
+    if st.session_state.current_file is None:
+        st.session_state.current_file = file_name
+    return file_name
+
+def get_original_data(file_name):
+    """Return a file's original frame, parsing a workbook sheet the first time it is used"""
+    file_info = st.session_state.files[file_name]
+    if file_info["data"] is None:
+        workbook = st.session_state.workbooks[file_info["workbook"]]
+        with st.spinner(f"Loading sheet {file_info['sheet']} of {file_info['workbook']}..."):
+            df, metadata, _ = load_uploaded_file(
+                BytesIO(workbook["content"]), ".xlsx", compact=workbook["compact"], sheet_name=file_info["sheet"]
+            )
+        file_info.update(data=df, **metadata)
+    return file_info["data"]
+
+def forget_file(file_name):
+    """Drop all per-file state for a removed file"""
+    st.session_state.processed_data.pop(file_name, None)
+    st.session_state.data_versions.pop(file_name, None)
+    st.session_state.pending_operations.pop(file_name, None)
+    st.session_state.cleaning_history.pop(file_name, None)
+    for kind in ("original", "processed"):
+        st.session_state.frame_stats.pop((file_name, kind), None)
+    # Caches keyed by (file name, ...)
+    for cache in (
+        st.session_state.sort_orders,
+        st.session_state.column_summaries,
+        st.session_state.histogram_bins,
+        st.session_state.group_aggregates,
+        st.session_state.box_summaries,
+        st.session_state.pair_plot_orders,
+        st.session_state.correlations
+    ):
+        for key in [key for key in cache if key[0] == file_name]:
+            del cache[key]
+    st.session_state.figure_cache.discard(lambda key: key[0] == file_name)
+    # Widget state of the file's views (column selection, sorting and paging), which may name
+    # columns a replacement file doesn't have
+    widget_keys = [f"selected_columns_{file_name}", f"col_select_{file_name}"]
+    for kind in ("original", "processed"):
+        widget_keys += [f"{prefix}_{kind}_{file_name}" for prefix in ("sort_column", "sort_direction", "page_size", "page")]
+    for widget_key in widget_keys:
+        st.session_state.pop(widget_key, None)
+    # A workbook's bytes are kept only while one of its sheets is in the file list
+    open_workbooks = {
+        info.get("workbook") for name, info in st.session_state.files.items() if name != file_name
+    }
+    for workbook_name in [name for name in st.session_state.workbooks if name not in open_workbooks]:
+        del st.session_state.workbooks[workbook_name]
+
+def is_new_upload(file):
+    """Return True if an uploaded file is not loaded yet or its contents changed since it was loaded"""
+    # Hashes are remembered per upload so reruns do not rehash unchanged files
+    content_hash = st.session_state.upload_hashes.get(file.file_id)
+    if content_hash is None:
+        content_hash = st.session_state.upload_hashes[file.file_id] = hash_uploaded_file(file)
+    if file.name in st.session_state.workbooks:
+        return st.session_state.workbooks[file.name]["hash"] != content_hash
+    file_info = st.session_state.files.get(file.name)
+    return file_info is None or file_info.get("hash") != content_hash
+
+def remove_upload(name):
+    """Remove an uploaded file, or every open sheet of an uploaded workbook, from the file list"""
+    removed = [
+        file_name for file_name, file_info in st.session_state.files.items()
+        if file_name == name or file_info.get("workbook") == name
+    ]
+    for file_name in removed:
+        del st.session_state.files[file_name]
+        forget_file(file_name)
+    st.session_state.workbooks.pop(name, None)
+    if st.session_state.current_file in removed:
+        st.session_state.current_file = None
+
+def get_summary_statistics(file_name, df, columns, kind="processed"):
+    """Return describe() output for columns, computing only columns not cached for this data version"""
+    version = get_data_version(file_name) if kind == "processed" else 0
+    summaries = {}
+    for col in columns:
+        key = (file_name, kind, col)
+        cached = st.session_state.column_summaries.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, df[col].describe())
+            st.session_state.column_summaries[key] = cached
+        summaries[col] = cached[1]
+    return pd.DataFrame(summaries)
+
+# Rows per page offered by the data viewer
+PAGE_SIZES = [10, 25, 50, 100, 500]
+
+def get_sort_order(file_name, df, column, ascending=True, kind="processed"):
+    """Return row positions of df sorted by column, cached per (file, column, direction, data version)"""
+    version = get_data_version(file_name) if kind == "processed" else 0
+    key = (file_name, kind, column, ascending)
+    cached = st.session_state.sort_orders.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    # Orders computed for older versions of this frame can never be used again
+    for stale in [k for k, (v, _) in st.session_state.sort_orders.items() if k[:2] == key[:2] and v != version]:
+        del st.session_state.sort_orders[stale]
+
+    values = df[column].reset_index(drop=True)
+    try:
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+    except TypeError:
+        # Mixed-type columns are ordered by their text
+        order = values.astype(str).sort_values(ascending=ascending, kind="stable").index.to_numpy()
+    st.session_state.sort_orders[key] = (version, order)
+    return order
+
+def show_data_page(df, file_name, kind="processed", columns=None):
+    """Show one page of a frame, sorted server-side if requested; only that page is sent to the browser"""
+    columns = df.columns.tolist() if columns is None else columns
+    key = f"{kind}_{file_name}"
+    
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox("Sort by:", ["(file order)"] + columns, key=f"sort_column_{key}")
+    with col2:
+        sort_direction = st.selectbox("Order:", ["Ascending", "Descending"], key=f"sort_direction_{key}")
+    with col3:
+        page_size = st.selectbox("Rows per page:", PAGE_SIZES, key=f"page_size_{key}")
+    
+    page_count = max(1, -(-len(df) // page_size))
+    page_key = f"page_{key}"
+    # Keep the page in range when the page size or the data shrinks
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    with col4:
+        page = st.number_input(f"Page (of {page_count:,}):", min_value=1, max_value=page_count, step=1, key=page_key)
+    
+    start = (page - 1) * page_size
+    stop = min(start + page_size, len(df))
+    if sort_column in columns:
+        positions = get_sort_order(file_name, df, sort_column, sort_direction == "Ascending", kind)[start:stop]
+        page_df = df.iloc[positions]
+    else:
+        page_df = df.iloc[start:stop]
+    
+    st.dataframe(page_df[columns], use_container_width=True)
+    if len(df):
+        st.caption(f"Rows {start + 1:,}–{stop:,} of {len(df):,}")
+    else:
+        st.caption("No rows")
+
+def create_file_stats_cards(df, file_name, kind="processed"):
     """Create statistics cards for the dataframe"""
+    stats = get_frame_stats(file_name, df, kind)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -339,7 +984,7 @@ def create_file_stats_cards(df):
         """.format(df.shape[1]), unsafe_allow_html=True)
     
     with col3:
-        missing_values = df.isna().sum().sum()
+        missing_values = int(stats["null_counts"].sum())
         st.markdown("""
         <div class="stat-card">
             <h4>Missing Values</h4>
@@ -348,7 +993,7 @@ def create_file_stats_cards(df):
         """.format(missing_values), unsafe_allow_html=True)
     
     with col4:
-        duplicates = df.duplicated().sum()
+        duplicates = stats["duplicates"]
         st.markdown("""
         <div class="stat-card">
             <h4>Duplicates</h4>
@@ -356,6 +1001,500 @@ def create_file_stats_cards(df):
         </div>
         """.format(duplicates), unsafe_allow_html=True)
 
+# Charts above this many points are reduced before they are sent to the browser
+CHART_POINT_BUDGET = int(os.environ.get("DATA_SWEEPER_CHART_POINTS", 10_000))
+
+# Grid cells per axis used to measure point density for scatter sampling
+SCATTER_DENSITY_GRID = 64
+
+def chart_axis_values(series):
+    """Return a series as floats for measuring distances along a chart axis"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").view(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    # Categories and text are spaced evenly in row order
+    return np.arange(len(series), dtype=np.float64)
+
+def lttb_indices(x, y, n_out):
+    """Return positions of n_out points chosen by Largest-Triangle-Three-Buckets
+
+    The first and last points are kept; every bucket in between keeps the point forming the
+    largest triangle with the previously kept point and the average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def min_max_indices(y, n_out):
+    """Return positions of the minimum and maximum of equal buckets plus both ends, at most n_out points"""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    bucket_size = -(-n // max((n_out - 2) // 2, 1))
+    bucket_count = -(-n // bucket_size)
+    padded = np.full(bucket_count * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(bucket_count, bucket_size)
+    offsets = np.arange(bucket_count) * bucket_size
+    return np.unique(np.concatenate([
+        [0, n - 1],
+        offsets + np.nanargmin(buckets, axis=1),
+        offsets + np.nanargmax(buckets, axis=1)
+    ]))
+
+def downsample_line_chart(df, x_col, y_cols, budget, method="LTTB"):
+    """Reduce every series of a line chart to its share of the point budget
+
+    Returns a long-form frame (x_col, variable, value) in x order and the number of points kept.
+    """
+    per_series = max(budget // len(y_cols), 3)
+    if not df[x_col].is_monotonic_increasing:
+        df = df.sort_values(x_col, kind="stable")
+    frames = []
+    for col in y_cols:
+        series = df[[x_col] if col == x_col else [x_col, col]].dropna()
+        if len(series) > per_series:
+            y = series[col].to_numpy(dtype=np.float64)
+            if method == "LTTB":
+                positions = lttb_indices(chart_axis_values(series[x_col]), y, per_series)
+            else:
+                positions = min_max_indices(y, per_series)
+            series = series.iloc[positions]
+        frames.append(pd.DataFrame({x_col: series[x_col].to_numpy(), "variable": col, "value": series[col].to_numpy()}))
+    plot_df = pd.concat(frames, ignore_index=True)
+    return plot_df, len(plot_df)
+
+def density_sample_indices(x, y, n_out, grid=SCATTER_DENSITY_GRID, seed=0):
+    """Return row positions of a density-aware sample of at most n_out scatter points
+
+    Points are binned on a grid and every occupied cell keeps up to the same quota of points,
+    so dense regions are thinned while sparse regions and outliers are kept in full.
+    """
+    x = chart_axis_values(x)
+    y = chart_axis_values(y)
+    positions = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if len(positions) <= n_out:
+        return positions
+    x = x[positions]
+    y = y[positions]
+
+    def grid_coordinate(values):
+        span = values.max() - values.min()
+        if span == 0:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - values.min()) / span * grid).astype(np.int64), grid - 1)
+
+    cells = grid_coordinate(x) * grid + grid_coordinate(y)
+    counts = np.bincount(cells)
+    counts = counts[counts > 0]
+
+    # Largest per-cell quota whose total stays within the budget
+    low, high = 1, int(counts.max())
+    while low < high:
+        middle = (low + high + 1) // 2
+        if np.minimum(counts, middle).sum() <= n_out:
+            low = middle
+        else:
+            high = middle - 1
+
+    # Rank the points of each cell in random order and keep the first `quota` of them
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(cells)), cells))
+    sorted_cells = cells[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_cells, sorted_cells, side="left")
+    kept = order[rank < low]
+    if len(kept) > n_out:
+        # More occupied cells than the budget allows: keep a random subset of cells' points
+        kept = rng.choice(kept, n_out, replace=False)
+    return positions[np.sort(kept)]
+
+# Bins used for the small histograms in the Data Insights expander
+INSIGHTS_HISTOGRAM_BINS = 30
+
+def get_histogram_bins(file_name, df, column, bins, group=None):
+    """Bin a numeric column (per group if given) on the server, cached per data version
+
+    Returns (edges, counts) where counts maps each group value (None when ungrouped) to an
+    array of bin counts. Missing values and rows with a missing group are not counted.
+    """
+    version = get_data_version(file_name)
+    key = (file_name, column, bins, group)
+    cached = st.session_state.histogram_bins.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    if group is not None:
+        codes, group_values = pd.factorize(df[group], sort=True)
+    else:
+        codes, group_values = np.zeros(len(values), dtype=np.int64), [None]
+    valid = np.isfinite(values) & (codes >= 0)
+    values = values[valid]
+    codes = codes[valid]
+
+    edges = np.histogram_bin_edges(values, bins=bins) if len(values) else np.linspace(0, 1, bins + 1)
+    # Bin index of every value; the last bin includes its right edge like np.histogram
+    bin_index = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+    counts = np.bincount(codes * bins + bin_index, minlength=len(group_values) * bins)
+    counts = counts.reshape(len(group_values), bins)
+
+    result = (edges, {value: counts[i] for i, value in enumerate(group_values)})
+    st.session_state.histogram_bins[key] = (version, result)
+    return result
+
+def histogram_figure(edges, counts, column, title=None, group=None):
+    """Draw pre-binned counts as a histogram, stacking groups like px.histogram does"""
+    fig = go.Figure()
+    centers = (edges[:-1] + edges[1:]) / 2
+    widths = np.diff(edges)
+    for value, group_counts in counts.items():
+        fig.add_trace(go.Bar(
+            x=centers, y=group_counts, width=widths,
+            name=str(value) if group else None, showlegend=group is not None
+        ))
+    fig.update_layout(
+        title=title, barmode="relative", bargap=0, template="plotly_dark",
+        xaxis_title=column, yaxis_title="count", legend_title_text=group
+    )
+    return fig
+
+# Outlier points drawn per box and the per-group sample used for approximate quartiles
+BOX_OUTLIER_SAMPLE = 500
+BOX_QUANTILE_SAMPLE = 100_000
+
+def get_box_summary(file_name, df, column, group=None, approximate=False):
+    """Compute box plot statistics (per group if given) on the server, cached per data version
+
+    Returns (summary, outliers): summary has one row per group with the count, q1, median, q3
+    and whisker ends (the most extreme values within 1.5 IQR of the box), and outliers holds
+    at most BOX_OUTLIER_SAMPLE points per group beyond the whiskers, always including the most
+    extreme ones. With approximate, the quartiles of groups larger than BOX_QUANTILE_SAMPLE
+    rows are taken from a random sample of that size.
+    """
+    version = get_data_version(file_name)
+    key = (file_name, column, group, approximate)
+    cached = st.session_state.box_summaries.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    if group is not None:
+        codes, group_values = pd.factorize(df[group], sort=True)
+    else:
+        codes, group_values = np.zeros(len(values), dtype=np.int64), pd.Index([column])
+    valid = np.isfinite(values) & (codes >= 0)
+    values = values[valid]
+    codes = codes[valid]
+    n_groups = len(group_values)
+    rng = np.random.default_rng(0)
+
+    quantile_values, quantile_codes = values, codes
+    if approximate:
+        # Keep the first BOX_QUANTILE_SAMPLE rows of each group in a random order
+        order = rng.permutation(len(values))
+        rank = pd.Series(codes[order]).groupby(codes[order]).cumcount().to_numpy()
+        keep = order[rank < BOX_QUANTILE_SAMPLE]
+        quantile_values, quantile_codes = values[keep], codes[keep]
+
+    quartiles = (
+        pd.Series(quantile_values).groupby(quantile_codes).quantile([0.25, 0.5, 0.75])
+        .unstack().reindex(index=range(n_groups), columns=[0.25, 0.5, 0.75])
+    )
+    q1, median, q3 = (quartiles[q].to_numpy() for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    lower, upper = (q1 - 1.5 * iqr)[codes], (q3 + 1.5 * iqr)[codes]
+    inside = (values >= lower) & (values <= upper)
+    fences = pd.Series(values[inside]).groupby(codes[inside]).agg(["min", "max"]).reindex(range(n_groups))
+
+    summary = pd.DataFrame({
+        "group": group_values,
+        "count": np.bincount(codes, minlength=n_groups),
+        "q1": q1, "median": median, "q3": q3,
+        "lowerfence": fences["min"].to_numpy(), "upperfence": fences["max"].to_numpy()
+    })
+    summary = summary[summary["count"] > 0].reset_index(drop=True)
+
+    # Sample the outliers in a random order, with each group's extremes first
+    outliers = pd.DataFrame({"code": codes[~inside], "value": values[~inside]})
+    priority = rng.random(len(outliers))
+    by_code = outliers.groupby("code")["value"]
+    priority[outliers.index.get_indexer(pd.concat([by_code.idxmin(), by_code.idxmax()]))] = -1
+    outliers = outliers.iloc[np.argsort(priority, kind="stable")]
+    outliers = outliers[outliers.groupby("code").cumcount() < BOX_OUTLIER_SAMPLE]
+    outliers = pd.DataFrame({
+        "group": group_values.take(outliers["code"].to_numpy()),
+        "value": outliers["value"].to_numpy()
+    })
+
+    result = (summary, outliers)
+    st.session_state.box_summaries[key] = (version, result)
+    return result
+
+def box_figure(summary, outliers, column, title=None, group=None):
+    """Draw precomputed box statistics with the sampled outliers as markers"""
+    fig = go.Figure()
+    fig.add_trace(go.Box(
+        x=summary["group"].astype(str), q1=summary["q1"], median=summary["median"], q3=summary["q3"],
+        lowerfence=summary["lowerfence"], upperfence=summary["upperfence"],
+        name=column, boxpoints=False, showlegend=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=outliers["group"].astype(str), y=outliers["value"], mode="markers",
+        name="outliers", showlegend=False, marker=dict(size=4)
+    ))
+    fig.update_layout(
+        title=title, template="plotly_dark", xaxis_type="category",
+        xaxis_title=group, yaxis_title=column
+    )
+    return fig
+
+# Pair plot panels whose sample puts more than PAIR_PLOT_DENSE_CELL points in one cell of a
+# PAIR_PLOT_GRID x PAIR_PLOT_GRID grid are drawn as 2-D histograms of the full data instead
+PAIR_PLOT_GRID = 40
+PAIR_PLOT_DENSE_CELL = 20
+
+def get_pair_plot_order(file_name, df, stratify=None):
+    """Return a random order of row positions for each stratum, cached per data version
+
+    Pair plot samples are prefixes of these orders, so they are reproducible and changing the
+    dimensions or the point budget doesn't resample. Rows with a missing stratum are left out.
+    """
+    version = get_data_version(file_name)
+    key = (file_name, stratify)
+    cached = st.session_state.pair_plot_orders.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    order = np.random.default_rng(0).permutation(len(df))
+    if stratify is None:
+        strata = [order]
+    else:
+        codes = pd.factorize(df[stratify])[0][order]
+        # A stable sort by stratum keeps the random order within each stratum
+        by_code = np.argsort(codes, kind="stable")
+        order, codes = order[by_code], codes[by_code]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.r_[0, bounds] if len(codes) else []
+        strata = [
+            positions for positions, start in zip(np.split(order, bounds), starts)
+            if codes[start] >= 0
+        ]
+
+    st.session_state.pair_plot_orders[key] = (version, strata)
+    return strata
+
+def pair_plot_sample(strata, n_rows):
+    """Return sorted positions of about n_rows rows, taken from each stratum in proportion to its size"""
+    total = sum(len(positions) for positions in strata)
+    if total > n_rows:
+        strata = [
+            positions[:min(len(positions), max(1, round(n_rows * len(positions) / total)))]
+            for positions in strata
+        ]
+    return np.sort(np.concatenate(strata)) if strata else np.empty(0, dtype=np.int64)
+
+def pair_plot_figure(df, sample, dimensions, color=None, title=None):
+    """Draw a pair plot from a row sample, with overplotted panels as full-data 2-D histograms
+
+    Diagonal panels are histograms of the full columns. Returns (figure, number of 2-D histogram panels).
+    """
+    size = len(dimensions)
+    fig = make_subplots(rows=size, cols=size, horizontal_spacing=0.03, vertical_spacing=0.03)
+    values = {col: df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in dimensions}
+    sampled = df.iloc[sample]
+    groups = list(sampled.groupby(color, sort=True, observed=True)) if color else [(None, sampled)]
+    palette = px.colors.qualitative.Plotly
+    in_legend = set()
+    density_panels = 0
+
+    for i, y_col in enumerate(dimensions):
+        for j, x_col in enumerate(dimensions):
+            if i == j:
+                column = values[x_col][np.isfinite(values[x_col])]
+                counts, edges = np.histogram(column, bins=INSIGHTS_HISTOGRAM_BINS)
+                fig.add_trace(go.Bar(
+                    x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                    marker_color="#888888", showlegend=False
+                ), row=i + 1, col=j + 1)
+                continue
+
+            x, y = values[x_col][sample], values[y_col][sample]
+            finite = np.isfinite(x) & np.isfinite(y)
+            if finite.any() and np.histogram2d(x[finite], y[finite], bins=PAIR_PLOT_GRID)[0].max() > PAIR_PLOT_DENSE_CELL:
+                x, y = values[x_col], values[y_col]
+                finite = np.isfinite(x) & np.isfinite(y)
+                counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=PAIR_PLOT_GRID)
+                fig.add_trace(go.Heatmap(
+                    x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                    z=np.where(counts.T > 0, counts.T, np.nan), colorscale="Viridis", showscale=False,
+                    hovertemplate="count: %{z}<extra></extra>"
+                ), row=i + 1, col=j + 1)
+                density_panels += 1
+                continue
+
+            for k, (value, group) in enumerate(groups):
+                fig.add_trace(go.Scattergl(
+                    x=group[x_col], y=group[y_col], mode="markers",
+                    marker=dict(size=3, color=palette[k % len(palette)]),
+                    name=str(value), legendgroup=str(value),
+                    showlegend=color is not None and value not in in_legend
+                ), row=i + 1, col=j + 1)
+                in_legend.add(value)
+
+    for k, col in enumerate(dimensions):
+        fig.update_xaxes(title_text=col, row=size, col=k + 1)
+        fig.update_yaxes(title_text=col, row=k + 1, col=1)
+    fig.update_layout(
+        title=title, template="plotly_dark", height=min(250 * size, 1500),
+        bargap=0, legend_title_text=color
+    )
+    return fig, density_panels
+
+# Rows per block of the correlation matrix products
+CORRELATION_CHUNK_ROWS = 65_536
+# Above this many columns the Heatmap shows the most correlated pairs instead of the full grid
+HEATMAP_MAX_COLUMNS = 30
+
+def pairwise_correlation(df, chunk_rows=CORRELATION_CHUNK_ROWS):
+    """Pearson correlation of all columns using only the rows where both values are present
+
+    Matches DataFrame.corr() but is built from a few matrix products per block of rows, so
+    it scales to hundreds of columns.
+    """
+    # Centering on the column means keeps the sums of squares well conditioned
+    means = df.mean().to_numpy(dtype=np.float64)
+    n = len(df.columns)
+    counts, sums, squares, products = (np.zeros((n, n)) for _ in range(4))
+    for start in range(0, len(df), chunk_rows):
+        values = df.iloc[start:start + chunk_rows].to_numpy(dtype=np.float64, na_value=np.nan) - means
+        present = np.isfinite(values)
+        mask = present.astype(np.float64)
+        values = np.where(present, values, 0.0)
+        counts += mask.T @ mask
+        # sums[i, j] is the sum of column i over the rows where column j is present too
+        sums += values.T @ mask
+        squares += (values * values).T @ mask
+        products += values.T @ values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = products - sums * sums.T / counts
+        variance_i = squares - sums * sums / counts
+        variance_j = variance_i.T
+        corr = covariance / np.sqrt(variance_i * variance_j)
+    corr[(counts < 2) | ~np.isfinite(corr)] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    return pd.DataFrame(corr, index=df.columns, columns=df.columns)
+
+def get_correlation_matrix(file_name, df, columns, method="pearson"):
+    """Return the correlation matrix of columns, sliced from a full matrix cached per data version
+
+    Spearman ranks each column once and correlates the ranks, so with missing values it can
+    differ slightly from pandas, which re-ranks every pair on their shared rows.
+    """
+    version = get_data_version(file_name)
+    key = (file_name, method)
+    cached = st.session_state.correlations.get(key)
+    if cached is None or cached[0] != version or not set(columns) <= set(cached[1].index):
+        numeric = df.select_dtypes(include=["number"])
+        if method == "spearman":
+            numeric = numeric.rank()
+        cached = (version, pairwise_correlation(numeric))
+        st.session_state.correlations[key] = cached
+    return cached[1].loc[columns, columns]
+
+def top_correlated_pairs(corr, k):
+    """Return the k column pairs with the largest absolute correlation"""
+    values = corr.to_numpy()
+    rows, cols = np.triu_indices(len(values), k=1)
+    strength = np.abs(values[rows, cols])
+    strength[np.isnan(strength)] = -1
+    best = np.argsort(-strength, kind="stable")[:k]
+    best = best[strength[best] >= 0]
+    return pd.DataFrame({
+        "Column A": corr.index[rows[best]],
+        "Column B": corr.columns[cols[best]],
+        "Correlation": values[rows[best], cols[best]]
+    })
+
+def cluster_order(corr):
+    """Order columns so strongly correlated ones sit together (spectral ordering on |correlation|)"""
+    affinity = np.nan_to_num(np.abs(corr.to_numpy()))
+    np.fill_diagonal(affinity, 0)
+    laplacian = np.diag(affinity.sum(axis=1)) - affinity
+    fiedler = np.linalg.eigh(laplacian)[1][:, 1] if len(affinity) > 2 else np.arange(len(affinity))
+    return corr.index[np.argsort(fiedler, kind="stable")]
+
+# Limits for each session's cache of generated figures, overridable through the environment
+FIGURE_CACHE_MAX_ENTRIES = int(os.environ.get("DATA_SWEEPER_FIGURE_CACHE_ENTRIES", 32))
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("DATA_SWEEPER_FIGURE_CACHE_MB", 64)) * 1024 * 1024
+
+def get_cached_figure(file_name, params):
+    """Return (figure, notes) generated with these chart parameters on the current data, or None"""
+    return st.session_state.figure_cache.get((file_name, get_data_version(file_name), params))
+
+def cache_figure(file_name, params, fig, notes=()):
+    """Keep a generated figure and the notes shown under it; returns (figure, notes)
+
+    Entries are sized by their serialized figure, so the byte cap tracks what is sent to the browser.
+    """
+    notes = list(notes)
+    size = len(fig.to_json()) + sum(
+        int(note.memory_usage(deep=True).sum()) for note in notes if isinstance(note, pd.DataFrame)
+    )
+    st.session_state.figure_cache.put((file_name, get_data_version(file_name), params), fig, size, notes)
+    return fig, notes
+
+def show_figure(fig, notes=()):
+    """Draw a figure followed by its notes (captions, or tables for dataframes)"""
+    st.plotly_chart(fig, use_container_width=True)
+    for note in notes:
+        if isinstance(note, pd.DataFrame):
+            st.dataframe(note, use_container_width=True)
+        else:
+            st.caption(note)
+
+# Aggregates offered for Bar charts
+CHART_AGGREGATES = ["sum", "mean", "count", "median"]
+
+def get_grouped_aggregate(file_name, df, keys, value_col, aggregate="sum", top_n=None):
+    """Aggregate value_col grouped by keys, cached per data version and shared by Bar and Pie charts
+
+    With top_n, categories of the first key outside the top_n largest aggregates are
+    combined into a single "Other" category before aggregating.
+    """
+    version = get_data_version(file_name)
+    key = (file_name, tuple(keys), value_col, aggregate, top_n)
+    cached = st.session_state.group_aggregates.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    by = [df[col] for col in keys]
+    if top_n is not None:
+        totals = get_grouped_aggregate(file_name, df, keys[:1], value_col, aggregate)
+        if len(totals) > top_n:
+            top = totals.nlargest(top_n, value_col)[keys[0]]
+            category = df[keys[0]].astype(object)
+            by[0] = category.where(category.isin(top) | category.isna(), "Other")
+
+    result = df.groupby(by, observed=True)[value_col].agg(aggregate).reset_index()
+    st.session_state.group_aggregates[key] = (version, result)
+    return result
+
 # App header with logo and title
 st.markdown("""
 <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 1rem;">
@@ -394,52 +1533,176 @@ with st.sidebar:
         st.session_state.current_file = None
     if 'processed_data' not in st.session_state:
         st.session_state.processed_data = {}
+    if 'data_versions' not in st.session_state:
+        st.session_state.data_versions = {}
+    if 'frame_stats' not in st.session_state:
+        st.session_state.frame_stats = {}
+    if 'pending_operations' not in st.session_state:
+        st.session_state.pending_operations = {}
+    if 'cleaning_history' not in st.session_state:
+        st.session_state.cleaning_history = {}
+    if 'workbooks' not in st.session_state:
+        st.session_state.workbooks = {}
+    if 'upload_hashes' not in st.session_state:
+        st.session_state.upload_hashes = {}
+    if 'sort_orders' not in st.session_state:
+        st.session_state.sort_orders = {}
+    if 'column_summaries' not in st.session_state:
+        st.session_state.column_summaries = {}
+    if 'histogram_bins' not in st.session_state:
+        st.session_state.histogram_bins = {}
+    if 'group_aggregates' not in st.session_state:
+        st.session_state.group_aggregates = {}
+    if 'box_summaries' not in st.session_state:
+        st.session_state.box_summaries = {}
+    if 'pair_plot_orders' not in st.session_state:
+        st.session_state.pair_plot_orders = {}
+    if 'correlations' not in st.session_state:
+        st.session_state.correlations = {}
+    if 'figure_cache' not in st.session_state:
+        st.session_state.figure_cache = SizedLRUCache(FIGURE_CACHE_MAX_ENTRIES, FIGURE_CACHE_MAX_BYTES)
 
 # Upload section
 if selected == "Upload":
     st.markdown("## 📤 Upload Your Data")
-    st.markdown("Upload CSV or Excel files to begin processing. You can upload multiple files and switch between them.")
+    st.markdown("Upload CSV, Excel, Parquet or Feather/Arrow files to begin processing. You can upload multiple files and switch between them.")
+    
+    uploaded_files = st.file_uploader(
+        "Choose files:", type=["csv", "xlsx", "xls", "parquet", "feather", "arrow"], accept_multiple_files=True
+    )
     
-    uploaded_files = st.file_uploader("Choose files:", type=["csv", "xlsx", "xls"], accept_multiple_files=True)
+    compact_memory = st.checkbox(
+        "Compact memory",
+        value=False,
+        help="Downcast numeric columns and store low-cardinality text as categories to reduce memory usage."
+    )
+    
+    # Out-of-core mode for files larger than memory, read from a server directory
+    with st.expander("📦 Open a file larger than memory (out-of-core mode)"):
+        if OUT_OF_CORE_DATA_DIR and os.path.isdir(OUT_OF_CORE_DATA_DIR):
+            server_files = sorted(
+                name for name in os.listdir(OUT_OF_CORE_DATA_DIR)
+                if os.path.splitext(name)[-1].lower() in STREAMABLE_EXTENSIONS
+                and os.path.isfile(os.path.join(OUT_OF_CORE_DATA_DIR, name))
+            )
+            if server_files:
+                large_file = st.selectbox("File on the server:", server_files)
+                if st.button("Open out of core"):
+                    source_path = os.path.join(OUT_OF_CORE_DATA_DIR, large_file)
+                    try:
+                        chunks = iter_file_chunks(source_path, OUT_OF_CORE_SAMPLE_ROWS)
+                        sample = next(chunks)
+                        chunks.close()
+                        forget_file(large_file)
+                        st.session_state.files[large_file] = {
+                            "data": sample,
+                            "size": os.path.getsize(source_path),
+                            "type": os.path.splitext(large_file)[-1].lower(),
+                            "source_path": source_path
+                        }
+                        st.session_state.processed_data[large_file] = make_working_copy(sample)
+                        st.session_state.current_file = large_file
+                        st.success(f"✅ Opened {large_file} out of core!")
+                    except Exception as e:
+                        st.error(f"❌ Error opening {large_file}: {str(e)}")
+            else:
+                st.info(f"No CSV, Parquet or Feather/Arrow files found in {OUT_OF_CORE_DATA_DIR}.")
+        else:
+            st.info("Set the DATA_SWEEPER_DATA_DIR environment variable to a server directory to process files larger than memory.")
     
     if uploaded_files:
-        for file in uploaded_files:
-            # Check if file is already in session state
-            if file.name not in st.session_state.files:
-                # Show progress bar for file loading
+        # Parse new files concurrently, each with its own progress bar updated from this thread
+        pending_files = [file for file in uploaded_files if is_new_upload(file)]
+        uploaded_ids = {file.file_id for file in uploaded_files}
+        for file_id in [file_id for file_id in st.session_state.upload_hashes if file_id not in uploaded_ids]:
+            del st.session_state.upload_hashes[file_id]
+        # A changed file uploaded under a known name replaces the old one and its state
+        for file in pending_files:
+            remove_upload(file.name)
+        
+        # .xlsx workbooks are only indexed here; each sheet is parsed when it is first used
+        for file in [file for file in pending_files if os.path.splitext(file.name)[-1].lower() == ".xlsx"]:
+            try:
+                register_workbook(file, compact=compact_memory)
+                sheet_count = len(st.session_state.workbooks[file.name]["sheets"])
+                st.success(f"✅ {file.name} indexed: {sheet_count} sheet{'s' if sheet_count != 1 else ''}")
+            except Exception as e:
+                st.error(f"❌ Error loading {file.name}: {str(e)}")
+        pending_files = [file for file in pending_files if os.path.splitext(file.name)[-1].lower() != ".xlsx"]
+        
+        if pending_files:
+            cache = get_parse_cache()
+            indicators = {}
+            progress = {}
+            for file in pending_files:
                 progress_bar = st.progress(0)
                 status_text = st.empty()
-                
-                for i in range(101):
-                    progress_bar.progress(i)
-                    status_text.text(f"Loading {file.name}... {i}%")
-                    time.sleep(0.01)
-                
-                # Read the file
-                file_extension = os.path.splitext(file.name)[-1].lower()
-                try:
-                    if file_extension == ".csv":
-                        df = pd.read_csv(file)
-                    elif file_extension in [".xlsx", ".xls"]:
-                        df = pd.read_excel(file)
-                    
-                    # Store file in session state
-                    st.session_state.files[file.name] = {
-                        "data": df,
-                        "size": file.size,
-                        "type": file_extension
-                    }
-                    
-                    # Set as current file if none selected
-                    if st.session_state.current_file is None:
-                        st.session_state.current_file = file.name
-                    
-                    # Store processed data
-                    st.session_state.processed_data[file.name] = df
-                    
-                    status_text.success(f"✅ {file.name} loaded successfully!")
-                except Exception as e:
-                    status_text.error(f"❌ Error loading {file.name}: {str(e)}")
+                status_text.text(f"Loading {file.name}...")
+                indicators[file.name] = (progress_bar, status_text)
+                progress[file.name] = 0.0
+
+            # Excel parsers hold the GIL, so .xls files get worker processes when parsed alongside others
+            excel_files = [file for file in pending_files if os.path.splitext(file.name)[-1].lower() == ".xls"]
+            excel_pool = None
+            if excel_files and len(pending_files) > 1:
+                excel_pool = ProcessPoolExecutor(max_workers=min(len(excel_files), INGEST_MAX_WORKERS))
+
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(pending_files), INGEST_MAX_WORKERS)) as pool:
+                    futures = {}
+                    for file in pending_files:
+                        def update_progress(fraction, file_name=file.name):
+                            progress[file_name] = fraction
+
+                        # Read the file in chunks, driving the progress bar from bytes consumed
+                        file_extension = os.path.splitext(file.name)[-1].lower()
+                        future = pool.submit(
+                            load_uploaded_file, file, file_extension, update_progress,
+                            compact=compact_memory, cache=cache, excel_pool=excel_pool
+                        )
+                        futures[future] = (file, file_extension)
+
+                    running = set(futures)
+                    while running:
+                        done, running = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            file, file_extension = futures[future]
+                            progress_bar, status_text = indicators[file.name]
+                            try:
+                                df, metadata, cache_hit = future.result()
+                            except Exception as e:
+                                status_text.error(f"❌ Error loading {file.name}: {str(e)}")
+                                continue
+
+                            # Store file in session state as soon as it is parsed
+                            st.session_state.files[file.name] = {
+                                "data": df,
+                                "size": file.size,
+                                "type": file_extension,
+                                **metadata
+                            }
+                            
+                            # Set as current file if none selected
+                            if st.session_state.current_file is None:
+                                st.session_state.current_file = file.name
+                            
+                            # Store processed data as a copy-on-write view of the (shared, immutable) original
+                            st.session_state.processed_data[file.name] = make_working_copy(df)
+                            
+                            progress_bar.progress(100)
+                            if cache_hit:
+                                status_text.success(f"✅ {file.name} loaded from cache!")
+                            else:
+                                status_text.success(f"✅ {file.name} loaded successfully!")
+
+                        for future in running:
+                            file_name = futures[future][0].name
+                            progress_bar, status_text = indicators[file_name]
+                            progress_bar.progress(int(progress[file_name] * 100))
+                            status_text.text(f"Loading {file_name}... {int(progress[file_name] * 100)}%")
+            finally:
+                if excel_pool is not None:
+                    excel_pool.shutdown()
         
         # Display uploaded files
         st.markdown("### 📁 Uploaded Files")
@@ -453,12 +1716,21 @@ if selected == "Upload":
             
             with col2:
                 st.markdown(f"**Size:** {get_file_size_display(file_info['size'])}")
+                if "memory_after" in file_info:
+                    if file_info["memory_after"] != file_info["memory_before"]:
+                        st.markdown(
+                            f"**Memory:** {get_file_size_display(file_info['memory_before'])} → "
+                            f"{get_file_size_display(file_info['memory_after'])}"
+                        )
+                    else:
+                        st.markdown(f"**Memory:** {get_file_size_display(file_info['memory_after'])}")
+                elif file_info["data"] is None:
+                    st.markdown("**Memory:** loaded on first use")
             
             with col3:
                 if st.button("🗑️", key=f"delete_{file_name}"):
                     del st.session_state.files[file_name]
-                    if file_name in st.session_state.processed_data:
-                        del st.session_state.processed_data[file_name]
+                    forget_file(file_name)
                     
                     if st.session_state.current_file == file_name:
                         if st.session_state.files:
@@ -467,6 +1739,28 @@ if selected == "Upload":
                             st.session_state.current_file = None
                     
                     st.experimental_rerun()
+        
+        # Sheets of multi-sheet workbooks can be opened one at a time
+        multi_sheet_workbooks = {
+            name: workbook for name, workbook in st.session_state.workbooks.items() if len(workbook["sheets"]) > 1
+        }
+        if multi_sheet_workbooks:
+            st.markdown("### 📑 Workbook Sheets")
+            
+            for workbook_name, workbook in multi_sheet_workbooks.items():
+                sheet_labels = {
+                    f"{name} ({rows or '?'} rows × {columns or '?'} columns)": name
+                    for name, rows, columns in workbook["sheets"]
+                }
+                col1, col2 = st.columns([3, 1])
+                
+                with col1:
+                    sheet_label = st.selectbox(f"Sheets in {workbook_name}:", list(sheet_labels), key=f"sheet_{workbook_name}")
+                
+                with col2:
+                    if st.button("Open sheet", key=f"open_sheet_{workbook_name}"):
+                        st.session_state.current_file = open_workbook_sheet(workbook_name, sheet_labels[sheet_label])
+                        st.experimental_rerun()
     
     else:
         st.info("👆 Upload your files to get started!")
@@ -489,15 +1783,18 @@ if selected == "Upload":
             sample_data.loc[np.random.choice(sample_data.index, 5), 'Category'] = np.nan
             sample_data = pd.concat([sample_data, sample_data.iloc[0:5]])
             
-            # Store in session state
+            # New random data replaces any earlier sample, so its cached state must go too
             sample_filename = "sample_data.csv"
+            forget_file(sample_filename)
+            
+            # Store in session state
             st.session_state.files[sample_filename] = {
                 "data": sample_data,
                 "size": len(sample_data.to_csv().encode('utf-8')),
                 "type": ".csv"
             }
             st.session_state.current_file = sample_filename
-            st.session_state.processed_data[sample_filename] = sample_data
+            st.session_state.processed_data[sample_filename] = make_working_copy(sample_data)
             
             st.success("✅ Sample data loaded successfully!")
             st.experimental_rerun()
@@ -506,13 +1803,14 @@ if selected == "Upload":
 elif selected == "Preview":
     if st.session_state.current_file:
         file_name = st.session_state.current_file
+        df = get_original_data(file_name)
         file_info = st.session_state.files[file_name]
-        df = file_info["data"]
         
         st.markdown(f"## 🔍 Previewing: {file_name}")
+        show_out_of_core_notice(file_info)
         
         # File statistics
-        create_file_stats_cards(df)
+        create_file_stats_cards(df, file_name, kind="original")
         
         # Data preview
         st.markdown("### Data Preview")
@@ -551,7 +1849,7 @@ elif selected == "Preview":
         
         # Display dataframe with selected columns
         if col_select:
-            st.dataframe(df[col_select].head(10), use_container_width=True)
+            show_data_page(df, file_name, kind="original", columns=col_select)
             
             # Show data types
             st.markdown("### Data Types")
@@ -563,7 +1861,9 @@ elif selected == "Preview":
             numeric_cols = df[col_select].select_dtypes(include=['number']).columns
             if not numeric_cols.empty:
                 st.markdown("### Summary Statistics")
-                st.dataframe(df[numeric_cols].describe(), use_container_width=True)
+                st.dataframe(
+                    get_summary_statistics(file_name, df, numeric_cols, kind="original"), use_container_width=True
+                )
         else:
             st.warning("Please select at least one column to display.")
     else:
@@ -575,19 +1875,44 @@ elif selected == "Clean":
         file_name = st.session_state.current_file
         
         # Get the original data
-        original_df = st.session_state.files[file_name]["data"]
+        original_df = get_original_data(file_name)
         
         # Get the processed data (or use original if not yet processed)
         if file_name in st.session_state.processed_data:
             df = st.session_state.processed_data[file_name]
         else:
-            df = original_df.copy()
+            df = make_working_copy(original_df)
             st.session_state.processed_data[file_name] = df
         
         st.markdown(f"## 🧹 Cleaning: {file_name}")
+        show_out_of_core_notice(st.session_state.files[file_name])
         
         # File statistics
-        create_file_stats_cards(df)
+        create_file_stats_cards(df, file_name)
+        
+        # Deferred mode queues operations and runs them, fused, when the data is next needed
+        st.checkbox(
+            "Deferred mode",
+            key="deferred_cleaning",
+            help="Queue cleaning operations and run them together when the data is needed in Visualize or Convert."
+        )
+        
+        pending_operations = st.session_state.pending_operations.get(file_name, [])
+        if pending_operations:
+            st.markdown(f"#### ⏳ {len(pending_operations)} queued operations")
+            for i, operation in enumerate(pending_operations, 1):
+                st.markdown(f"{i}. {describe_operation(operation)}")
+            
+            apply_col, discard_col = st.columns(2)
+            with apply_col:
+                if st.button("Apply queued operations"):
+                    get_processed_data(file_name)
+                    st.experimental_rerun()
+            with discard_col:
+                if st.button("Discard queued operations"):
+                    del st.session_state.pending_operations[file_name]
+                    st.experimental_rerun()
+            st.info("Cleaning options below reflect the data before the queued operations.")
         
         # Cleaning options
         st.markdown("### Cleaning Options")
@@ -599,11 +1924,15 @@ elif selected == "Clean":
             
             # Remove duplicates
             if st.checkbox("Remove duplicate rows", key="remove_duplicates"):
-                duplicate_count = df.duplicated().sum()
+                dedupe_columns = st.multiselect(
+                    "Compare only these columns (leave empty to compare all):",
+                    df.columns.tolist()
+                )
+                row_hashes = get_frame_stats(file_name, df)["row_hashes"]
+                duplicate_count = int(row_hashes.duplicated(df, dedupe_columns or None).sum())
                 if duplicate_count > 0:
                     if st.button(f"Remove {duplicate_count} duplicates"):
-                        df = df.drop_duplicates()
-                        st.session_state.processed_data[file_name] = df
+                        submit_cleaning_operation(file_name, df, {"op": "drop_duplicates", "subset": dedupe_columns or None})
                         st.success(f"✅ Removed {duplicate_count} duplicate rows!")
                         st.experimental_rerun()
                 else:
@@ -611,7 +1940,8 @@ elif selected == "Clean":
             
             # Handle missing values
             if st.checkbox("Handle missing values", key="handle_missing"):
-                missing_cols = df.columns[df.isna().any()].tolist()
+                null_counts = get_frame_stats(file_name, df)["null_counts"]
+                missing_cols = null_counts[null_counts > 0].index.tolist()
                 
                 if missing_cols:
                     missing_strategy = st.selectbox(
@@ -625,8 +1955,7 @@ elif selected == "Clean":
                     if missing_strategy == "Drop rows with any missing values":
                         missing_count = df.isna().any(axis=1).sum()
                         if st.button(f"Drop {missing_count} rows with missing values"):
-                            df = df.dropna()
-                            st.session_state.processed_data[file_name] = df
+                            submit_cleaning_operation(file_name, df, {"op": "dropna"})
                             st.success(f"✅ Dropped {missing_count} rows with missing values!")
                             st.experimental_rerun()
                     
@@ -636,9 +1965,7 @@ elif selected == "Clean":
                         
                         if numeric_missing:
                             if st.button(f"Fill {len(numeric_missing)} numeric columns with mean"):
-                                for col in numeric_missing:
-                                    df[col] = df[col].fillna(df[col].mean())
-                                st.session_state.processed_data[file_name] = df
+                                submit_cleaning_operation(file_name, df, {"op": "fillna", "strategy": "mean", "columns": numeric_missing})
                                 st.success(f"✅ Filled missing values in {len(numeric_missing)} columns with mean!")
                                 st.experimental_rerun()
                         else:
@@ -650,9 +1977,7 @@ elif selected == "Clean":
                         
                         if numeric_missing:
                             if st.button(f"Fill {len(numeric_missing)} numeric columns with median"):
-                                for col in numeric_missing:
-                                    df[col] = df[col].fillna(df[col].median())
-                                st.session_state.processed_data[file_name] = df
+                                submit_cleaning_operation(file_name, df, {"op": "fillna", "strategy": "median", "columns": numeric_missing})
                                 st.success(f"✅ Filled missing values in {len(numeric_missing)} columns with median!")
                                 st.experimental_rerun()
                         else:
@@ -663,8 +1988,10 @@ elif selected == "Clean":
                         fill_value = st.text_input("Enter value to fill missing data:")
                         
                         if st.button("Fill missing values"):
-                            df[col_to_fill] = df[col_to_fill].fillna(fill_value)
-                            st.session_state.processed_data[file_name] = df
+                            submit_cleaning_operation(
+                                file_name, df,
+                                {"op": "fillna", "strategy": "value", "columns": [col_to_fill], "value": fill_value}
+                            )
                             st.success(f"✅ Filled missing values in {col_to_fill}!")
                             st.experimental_rerun()
                 else:
@@ -686,8 +2013,7 @@ elif selected == "Clean":
                     
                     if st.button("Rename column"):
                         if new_name and new_name != col_to_rename:
-                            df = df.rename(columns={col_to_rename: new_name})
-                            st.session_state.processed_data[file_name] = df
+                            submit_cleaning_operation(file_name, df, {"op": "rename_columns", "mapping": {col_to_rename: new_name}})
                             st.success(f"✅ Renamed column '{col_to_rename}' to '{new_name}'!")
                             st.experimental_rerun()
                 
@@ -695,8 +2021,7 @@ elif selected == "Clean":
                     cols_to_drop = st.multiselect("Select columns to drop:", df.columns)
                     
                     if cols_to_drop and st.button(f"Drop {len(cols_to_drop)} columns"):
-                        df = df.drop(columns=cols_to_drop)
-                        st.session_state.processed_data[file_name] = df
+                        submit_cleaning_operation(file_name, df, {"op": "drop_columns", "columns": cols_to_drop})
                         st.success(f"✅ Dropped {len(cols_to_drop)} columns!")
                         st.experimental_rerun()
                 
@@ -718,32 +2043,35 @@ elif selected == "Clean":
                             
                             if st.button("Create column"):
                                 if new_col_name:
-                                    if operation == "+":
-                                        df[new_col_name] = df[col1_calc] + df[col2_calc]
-                                    elif operation == "-":
-                                        df[new_col_name] = df[col1_calc] - df[col2_calc]
-                                    elif operation == "*":
-                                        df[new_col_name] = df[col1_calc] * df[col2_calc]
-                                    elif operation == "/":
-                                        df[new_col_name] = df[col1_calc] / df[col2_calc]
-                                    
-                                    st.session_state.processed_data[file_name] = df
+                                    submit_cleaning_operation(file_name, df, {
+                                        "op": "calculate_column",
+                                        "column": new_col_name,
+                                        "left": col1_calc,
+                                        "operator": operation,
+                                        "right": col2_calc
+                                    })
                                     st.success(f"✅ Created new column '{new_col_name}'!")
                                     st.experimental_rerun()
                         else:
                             st.warning("Need at least 2 numeric columns for calculations.")
                     
                     elif formula_type == "Custom expression":
-                        st.markdown("Enter a Python expression using column names, e.g., `df['A'] * 2 + df['B']`")
+                        st.markdown(
+                            "Enter an expression using column names, e.g., `A * 2 + B` or `df['Unit Price'].round(2)`. "
+                            "Arithmetic, comparisons, `and`/`or`/`not`, functions such as `sqrt`, `where` and `isna`, "
+                            "and `.str`/`.dt` methods are supported."
+                        )
                         custom_expr = st.text_area("Expression:")
                         
                         if st.button("Create column with expression"):
                             if new_col_name and custom_expr:
                                 try:
-                                    # Safely evaluate the expression
-                                    result = eval(custom_expr)
-                                    df[new_col_name] = result
-                                    st.session_state.processed_data[file_name] = df
+                                    # Reject disallowed syntax now; columns are checked when the step runs
+                                    compile_expression(custom_expr)
+                                    submit_cleaning_operation(
+                                        file_name, df,
+                                        {"op": "expression_column", "column": new_col_name, "expression": custom_expr}
+                                    )
                                     st.success(f"✅ Created new column '{new_col_name}'!")
                                     st.experimental_rerun()
                                 except Exception as e:
@@ -761,18 +2089,10 @@ elif selected == "Clean":
                 
                 if st.button(f"Convert {col_to_convert} to {target_type}"):
                     try:
-                        if target_type == "string":
-                            df[col_to_convert] = df[col_to_convert].astype(str)
-                        elif target_type == "integer":
-                            df[col_to_convert] = pd.to_numeric(df[col_to_convert], errors='coerce').astype('Int64')
-                        elif target_type == "float":
-                            df[col_to_convert] = pd.to_numeric(df[col_to_convert], errors='coerce')
-                        elif target_type == "datetime":
-                            df[col_to_convert] = pd.to_datetime(df[col_to_convert], errors='coerce')
-                        elif target_type == "category":
-                            df[col_to_convert] = df[col_to_convert].astype('category')
-                        
-                        st.session_state.processed_data[file_name] = df
+                        submit_cleaning_operation(
+                            file_name, df,
+                            {"op": "convert_type", "column": col_to_convert, "target": target_type}
+                        )
                         st.success(f"✅ Converted {col_to_convert} to {target_type}!")
                         st.experimental_rerun()
                     except Exception as e:
@@ -783,7 +2103,7 @@ elif selected == "Clean":
             st.markdown("#### Text Cleaning")
             
             # Text cleaning operations
-            text_cols = df.select_dtypes(include=['object']).columns.tolist()
+            text_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
             
             if text_cols:
                 text_col = st.selectbox("Select text column:", text_cols)
@@ -794,33 +2114,12 @@ elif selected == "Clean":
                 )
                 
                 if text_operations and st.button("Apply text operations"):
-                    modified = False
-                    
-                    if "Lowercase" in text_operations:
-                        df[text_col] = df[text_col].str.lower()
-                        modified = True
-                    
-                    if "Uppercase" in text_operations:
-                        df[text_col] = df[text_col].str.upper()
-                        modified = True
-                    
-                    if "Remove whitespace" in text_operations:
-                        df[text_col] = df[text_col].str.strip()
-                        modified = True
-                    
-                    if "Remove special characters" in text_operations:
-                        df[text_col] = df[text_col].str.replace(r'[^\w\s]', '', regex=True)
-                        modified = True
-                    
-                    if "Extract numbers" in text_operations:
-                        new_col = f"{text_col}_numbers"
-                        df[new_col] = df[text_col].str.extract(r'(\d+)', expand=False)
-                        modified = True
-                    
-                    if modified:
-                        st.session_state.processed_data[file_name] = df
-                        st.success("✅ Applied text operations successfully!")
-                        st.experimental_rerun()
+                    submit_cleaning_operation(
+                        file_name, df,
+                        {"op": "text_operations", "column": text_col, "operations": text_operations}
+                    )
+                    st.success("✅ Applied text operations successfully!")
+                    st.experimental_rerun()
             else:
                 st.info("No text columns found in the data.")
             
@@ -848,8 +2147,12 @@ elif selected == "Clean":
                             st.dataframe(outliers, use_container_width=True)
                             
                             if st.button("Remove these outliers"):
-                                df = df[z_scores <= z_threshold]
-                                st.session_state.processed_data[file_name] = df
+                                submit_cleaning_operation(file_name, df, {
+                                    "op": "remove_outliers",
+                                    "column": outlier_col,
+                                    "method": "zscore",
+                                    "threshold": z_threshold
+                                })
                                 st.success(f"✅ Removed {len(outliers)} outliers!")
                                 st.experimental_rerun()
                         else:
@@ -873,8 +2176,12 @@ elif selected == "Clean":
                             st.dataframe(outliers, use_container_width=True)
                             
                             if st.button("Remove these outliers"):
-                                df = df[(df[outlier_col] >= lower_bound) & (df[outlier_col] <= upper_bound)]
-                                st.session_state.processed_data[file_name] = df
+                                submit_cleaning_operation(file_name, df, {
+                                    "op": "remove_outliers",
+                                    "column": outlier_col,
+                                    "method": "iqr",
+                                    "threshold": iqr_factor
+                                })
                                 st.success(f"✅ Removed {len(outliers)} outliers!")
                                 st.experimental_rerun()
                         else:
@@ -884,13 +2191,29 @@ elif selected == "Clean":
         
         # Reset to original data
         if st.button("Reset to original data"):
-            st.session_state.processed_data[file_name] = original_df.copy()
+            st.session_state.pending_operations.pop(file_name, None)
+            st.session_state.cleaning_history.pop(file_name, None)
+            commit_processed_data(
+                file_name, make_working_copy(original_df),
+                st.session_state.frame_stats.get((file_name, "original"))
+            )
             st.success("✅ Reset to original data!")
             st.experimental_rerun()
         
+        # Export the applied operations as a recipe for the batch runner
+        cleaning_history = st.session_state.cleaning_history.get(file_name, [])
+        if cleaning_history:
+            st.download_button(
+                "⬇️ Export cleaning recipe",
+                data=recipe_to_json(cleaning_history),
+                file_name=f"{os.path.splitext(file_name)[0]}_recipe.json",
+                mime="application/json"
+            )
+            st.caption("Replay it on a folder of files with `python batch_clean.py recipe.json INPUT_DIR OUTPUT_DIR`.")
+        
         # Preview cleaned data
         st.markdown("### Preview Cleaned Data")
-        st.dataframe(df.head(10), use_container_width=True)
+        show_data_page(df, file_name)
         
         # Show changes summary
         if not df.equals(original_df):
@@ -907,14 +2230,16 @@ elif selected == "Clean":
                 changes.append(f"Columns: {len(original_df.columns)} → {len(df.columns)} ({len(df.columns) - len(original_df.columns):+d})")
             
             # Check for missing values changes
-            original_missing = original_df.isna().sum().sum()
-            current_missing = df.isna().sum().sum()
+            original_stats = get_frame_stats(file_name, original_df, kind="original")
+            current_stats = get_frame_stats(file_name, df)
+            original_missing = int(original_stats["null_counts"].sum())
+            current_missing = int(current_stats["null_counts"].sum())
             if original_missing != current_missing:
                 changes.append(f"Missing values: {original_missing} → {current_missing} ({current_missing - original_missing:+d})")
             
             # Check for duplicate changes
-            original_dupes = original_df.duplicated().sum()
-            current_dupes = df.duplicated().sum()
+            original_dupes = original_stats["duplicates"]
+            current_dupes = current_stats["duplicates"]
             if original_dupes != current_dupes:
                 changes.append(f"Duplicates: {original_dupes} → {current_dupes} ({current_dupes - original_dupes:+d})")
             
@@ -929,12 +2254,8 @@ elif selected == "Visualize":
     if st.session_state.current_file:
         file_name = st.session_state.current_file
         
-        # Get the processed data
-        if file_name in st.session_state.processed_data:
-            df = st.session_state.processed_data[file_name]
-        else:
-            df = st.session_state.files[file_name]["data"]
-            st.session_state.processed_data[file_name] = df
+        # Get the processed data, running any queued cleaning operations
+        df = get_processed_data(file_name)
         
         st.markdown(f"## 📊 Visualizing: {file_name}")
         
@@ -944,9 +2265,18 @@ elif selected == "Visualize":
             ["Bar Chart", "Line Chart", "Scatter Plot", "Histogram", "Box Plot", "Pie Chart", "Heatmap", "Pair Plot"]
         )
         
+        point_budget = st.number_input(
+            "Point budget per chart:",
+            min_value=1_000,
+            max_value=1_000_000,
+            value=CHART_POINT_BUDGET,
+            step=1_000,
+            help="Line and scatter charts with more points than this are downsampled before drawing. Pair plots sample rows so that all scatter panels together stay within it."
+        )
+        
         # Get numeric and categorical columns
         numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        categorical_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
         
         if chart_type == "Bar Chart":
             st.markdown("### Bar Chart")
@@ -957,6 +2287,15 @@ elif selected == "Visualize":
                 
                 orientation = st.radio("Orientation:", ["Vertical", "Horizontal"])
                 
+                col1, col2 = st.columns(2)
+                with col1:
+                    aggregate = st.selectbox("Aggregate:", CHART_AGGREGATES)
+                with col2:
+                    top_n = st.number_input(
+                        "Top categories:", min_value=1, max_value=1000, value=20, step=1,
+                        help="Remaining categories are combined into \"Other\"."
+                    )
+                
                 color_option = None
                 if len(categorical_cols) > 1:
                     use_color = st.checkbox("Use color grouping")
@@ -964,24 +2303,30 @@ elif selected == "Visualize":
                         color_cols = [col for col in categorical_cols if col != x_axis]
                         color_option = st.selectbox("Color by:", color_cols)
                 
-                if st.button("Generate Bar Chart"):
+                figure_params = ("Bar Chart", x_axis, y_axis, orientation, aggregate, top_n, color_option)
+                figure = get_cached_figure(file_name, figure_params)
+                if st.button("Generate Bar Chart") and figure is None:
+                    # One bar (or segment) per group instead of one per row
+                    keys = [x_axis, color_option] if color_option else [x_axis]
+                    bar_data = get_grouped_aggregate(file_name, df, keys, y_axis, aggregate, top_n)
+                    
                     if orientation == "Vertical":
                         if color_option:
-                            fig = px.bar(df, x=x_axis, y=y_axis, color=color_option, 
-                                         title=f"{y_axis} by {x_axis}", 
+                            fig = px.bar(bar_data, x=x_axis, y=y_axis, color=color_option, 
+                                         title=f"{aggregate.capitalize()} of {y_axis} by {x_axis}", 
                                          template="plotly_dark")
                         else:
-                            fig = px.bar(df, x=x_axis, y=y_axis, 
-                                         title=f"{y_axis} by {x_axis}", 
+                            fig = px.bar(bar_data, x=x_axis, y=y_axis, 
+                                         title=f"{aggregate.capitalize()} of {y_axis} by {x_axis}", 
                                          template="plotly_dark")
                     else:
                         if color_option:
-                            fig = px.bar(df, y=x_axis, x=y_axis, color=color_option, 
-                                         title=f"{y_axis} by {x_axis}", 
+                            fig = px.bar(bar_data, y=x_axis, x=y_axis, color=color_option, 
+                                         title=f"{aggregate.capitalize()} of {y_axis} by {x_axis}", 
                                          orientation='h', template="plotly_dark")
                         else:
-                            fig = px.bar(df, y=x_axis, x=y_axis, 
-                                         title=f"{y_axis} by {x_axis}", 
+                            fig = px.bar(bar_data, y=x_axis, x=y_axis, 
+                                         title=f"{aggregate.capitalize()} of {y_axis} by {x_axis}", 
                                          orientation='h', template="plotly_dark")
                     
                     fig.update_layout(
@@ -990,7 +2335,10 @@ elif selected == "Visualize":
                         font=dict(color="white")
                     )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    figure = cache_figure(file_name, figure_params, fig)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Bar charts require both categorical and numeric columns.")
         
@@ -1011,10 +2359,31 @@ elif selected == "Visualize":
                 
                 y_axes = st.multiselect("Y-axis (numeric):", numeric_cols)
                 
-                if y_axes and st.button("Generate Line Chart"):
-                    fig = px.line(df, x=x_axis, y=y_axes, 
-                                  title=f"Line Chart of {', '.join(y_axes)} over {x_axis}", 
-                                  template="plotly_dark")
+                downsampling_method = st.radio(
+                    "Downsampling method:",
+                    ["LTTB", "Min/max per bucket"],
+                    horizontal=True,
+                    help="Used when the chart has more points than the point budget."
+                )
+                
+                figure_params = ("Line Chart", x_axis, tuple(y_axes), downsampling_method, point_budget)
+                figure = get_cached_figure(file_name, figure_params)
+                if y_axes and st.button("Generate Line Chart") and figure is None:
+                    notes = []
+                    total_points = len(df) * len(y_axes)
+                    if total_points > point_budget:
+                        # Keep the shape of each series with a bounded number of points
+                        plot_df, drawn_points = downsample_line_chart(
+                            df, x_axis, y_axes, point_budget, downsampling_method
+                        )
+                        fig = px.line(plot_df, x=x_axis, y="value", color="variable",
+                                      title=f"Line Chart of {', '.join(y_axes)} over {x_axis}",
+                                      template="plotly_dark")
+                        notes.append(f"Drew {drawn_points:,} of {total_points:,} points ({downsampling_method} downsampling).")
+                    else:
+                        fig = px.line(df, x=x_axis, y=y_axes, 
+                                      title=f"Line Chart of {', '.join(y_axes)} over {x_axis}", 
+                                      template="plotly_dark")
                     
                     fig.update_layout(
                         plot_bgcolor='rgba(0,0,0,0)',
@@ -1022,7 +2391,10 @@ elif selected == "Visualize":
                         font=dict(color="white")
                     )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    figure = cache_figure(file_name, figure_params, fig, notes)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Line charts require numeric columns.")
         
@@ -1046,11 +2418,23 @@ elif selected == "Visualize":
                     if size_cols:
                         size_option = st.selectbox("Size by:", size_cols)
                 
-                if st.button("Generate Scatter Plot"):
+                figure_params = ("Scatter Plot", x_axis, y_axis, color_option, size_option, point_budget)
+                figure = get_cached_figure(file_name, figure_params)
+                if st.button("Generate Scatter Plot") and figure is None:
+                    notes = []
+                    plot_df = df
+                    render_mode = "auto"
+                    if len(df) > point_budget:
+                        # Thin dense regions, keep sparse points, and draw with WebGL
+                        plot_df = df.iloc[density_sample_indices(df[x_axis], df[y_axis], point_budget)]
+                        render_mode = "webgl"
+                        notes.append(f"Drew {len(plot_df):,} of {len(df):,} points (density-aware sample, WebGL).")
+                    
                     fig = px.scatter(
-                        df, x=x_axis, y=y_axis, 
+                        plot_df, x=x_axis, y=y_axis, 
                         color=color_option, size=size_option,
                         title=f"Scatter Plot of {y_axis} vs {x_axis}",
+                        render_mode=render_mode,
                         template="plotly_dark"
                     )
                     
@@ -1060,7 +2444,10 @@ elif selected == "Visualize":
                         font=dict(color="white")
                     )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    figure = cache_figure(file_name, figure_params, fig, notes)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Scatter plots require at least 2 numeric columns.")
         
@@ -1077,21 +2464,19 @@ elif selected == "Visualize":
                     if use_color:
                         color_option = st.selectbox("Group by:", categorical_cols)
                 
-                if st.button("Generate Histogram"):
+                figure_params = ("Histogram", column, bins, color_option)
+                figure = get_cached_figure(file_name, figure_params)
+                if st.button("Generate Histogram") and figure is None:
+                    # Only bin edges and counts are sent to the browser
+                    edges, counts = get_histogram_bins(file_name, df, column, bins, color_option)
                     if color_option:
-                        fig = px.histogram(
-                            df, x=column, color=color_option, 
-                            nbins=bins, 
+                        fig = histogram_figure(
+                            edges, counts, column,
                             title=f"Histogram of {column} grouped by {color_option}",
-                            template="plotly_dark"
+                            group=color_option
                         )
                     else:
-                        fig = px.histogram(
-                            df, x=column, 
-                            nbins=bins, 
-                            title=f"Histogram of {column}",
-                            template="plotly_dark"
-                        )
+                        fig = histogram_figure(edges, counts, column, title=f"Histogram of {column}")
                     
                     fig.update_layout(
                         plot_bgcolor='rgba(0,0,0,0)',
@@ -1099,7 +2484,10 @@ elif selected == "Visualize":
                         font=dict(color="white")
                     )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    figure = cache_figure(file_name, figure_params, fig)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Histograms require numeric columns.")
         
@@ -1115,27 +2503,41 @@ elif selected == "Visualize":
                     if use_category:
                         x_axis = st.selectbox("Group by:", categorical_cols)
                 
-                if st.button("Generate Box Plot"):
-                    if x_axis:
-                        fig = px.box(
-                            df, x=x_axis, y=y_axis, 
-                            title=f"Box Plot of {y_axis} grouped by {x_axis}",
-                            template="plotly_dark"
-                        )
+                approximate = st.checkbox(
+                    "Approximate quartiles",
+                    help=f"Estimate the quartiles of groups over {BOX_QUANTILE_SAMPLE:,} rows from a random sample. Whiskers and outliers stay exact."
+                )
+                
+                figure_params = ("Box Plot", y_axis, x_axis, approximate)
+                figure = get_cached_figure(file_name, figure_params)
+                if st.button("Generate Box Plot") and figure is None:
+                    # Quartiles, whiskers and an outlier sample are computed here; only those are sent to the browser
+                    summary, outliers = get_box_summary(file_name, df, y_axis, x_axis, approximate)
+                    if summary.empty:
+                        st.info(f"{y_axis} has no values to plot.")
                     else:
-                        fig = px.box(
-                            df, y=y_axis, 
-                            title=f"Box Plot of {y_axis}",
-                            template="plotly_dark"
-                        )
+                        if x_axis:
+                            fig = box_figure(
+                                summary, outliers, y_axis,
+                                title=f"Box Plot of {y_axis} grouped by {x_axis}", group=x_axis
+                            )
+                        else:
+                            fig = box_figure(summary, outliers, y_axis, title=f"Box Plot of {y_axis}")
                     
-                    fig.update_layout(
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color="white")
-                    )
+                        fig.update_layout(
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color="white")
+                        )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                        notes = [
+                            f"Summarised {int(summary['count'].sum()):,} values in {len(summary):,} boxes; "
+                            f"showing {len(outliers):,} outlier points (at most {BOX_OUTLIER_SAMPLE:,} per box)."
+                        ]
+                        figure = cache_figure(file_name, figure_params, fig, notes)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Box plots require numeric columns.")
         
@@ -1145,10 +2547,16 @@ elif selected == "Visualize":
             if categorical_cols and numeric_cols:
                 names = st.selectbox("Category column:", categorical_cols)
                 values = st.selectbox("Value column (numeric):", numeric_cols)
+                top_n = st.number_input(
+                    "Top categories:", min_value=1, max_value=1000, value=20, step=1,
+                    help="Remaining categories are combined into \"Other\"."
+                )
                 
-                if st.button("Generate Pie Chart"):
-                    # Aggregate data for pie chart
-                    pie_data = df.groupby(names)[values].sum().reset_index()
+                figure_params = ("Pie Chart", names, values, top_n)
+                figure = get_cached_figure(file_name, figure_params)
+                if st.button("Generate Pie Chart") and figure is None:
+                    # Aggregate data for pie chart (shared with Bar charts through the group-by cache)
+                    pie_data = get_grouped_aggregate(file_name, df, [names], values, "sum", top_n)
                     
                     fig = px.pie(
                         pie_data, names=names, values=values,
@@ -1162,7 +2570,10 @@ elif selected == "Visualize":
                         font=dict(color="white")
                     )
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    figure = cache_figure(file_name, figure_params, fig)
+                
+                if figure:
+                    show_figure(*figure)
             else:
                 st.warning("Pie charts require both categorical and numeric columns.")
         
@@ -1170,16 +2581,33 @@ elif selected == "Visualize":
             st.markdown("### Heatmap")
             
             if len(numeric_cols) >= 2:
-                columns_for_heatmap = st.multiselect("Select columns for correlation:", numeric_cols, default=numeric_cols[:5])
+                columns_for_heatmap = st.multiselect("Select columns for correlation:", numeric_cols, default=numeric_cols)
+                method = st.radio("Method:", ["Pearson", "Spearman"], horizontal=True)
+                
+                top_k = None
+                if len(columns_for_heatmap) > HEATMAP_MAX_COLUMNS:
+                    top_k = st.number_input(
+                        "Most correlated pairs to show:", min_value=1, max_value=500, value=25, step=1,
+                        help=f"With more than {HEATMAP_MAX_COLUMNS} columns the heatmap shows only the columns of the most correlated pairs, grouped by similarity."
+                    )
                 
                 if columns_for_heatmap and len(columns_for_heatmap) >= 2:
-                    if st.button("Generate Heatmap"):
-                        corr = df[columns_for_heatmap].corr()
+                    figure_params = ("Heatmap", tuple(columns_for_heatmap), method, top_k)
+                    figure = get_cached_figure(file_name, figure_params)
+                    if st.button("Generate Heatmap") and figure is None:
+                        # Sliced from a full matrix computed once per data version
+                        corr = get_correlation_matrix(file_name, df, columns_for_heatmap, method.lower())
+                        
+                        if top_k:
+                            pairs = top_correlated_pairs(corr, top_k)
+                            involved = pd.unique(pairs[["Column A", "Column B"]].to_numpy().ravel())
+                            order = cluster_order(corr.loc[involved, involved])
+                            corr = corr.loc[order, order]
                         
                         fig = px.imshow(
-                            corr, text_auto=True, 
-                            title="Correlation Heatmap",
-                            color_continuous_scale='RdBu_r',
+                            corr, text_auto=".2f" if len(corr) <= 15 else False, 
+                            title=f"{method} Correlation Heatmap",
+                            color_continuous_scale='RdBu_r', zmin=-1, zmax=1,
                             template="plotly_dark"
                         )
                         
@@ -1189,7 +2617,13 @@ elif selected == "Visualize":
                             font=dict(color="white")
                         )
                         
-                        st.plotly_chart(fig, use_container_width=True)
+                        notes = []
+                        if top_k:
+                            notes = [f"{len(pairs)} most correlated pairs of {len(columns_for_heatmap)} columns:", pairs]
+                        figure = cache_figure(file_name, figure_params, fig, notes)
+                    
+                    if figure:
+                        show_figure(*figure)
                 else:
                     st.warning("Please select at least 2 columns for the heatmap.")
             else:
@@ -1208,11 +2642,15 @@ elif selected == "Visualize":
                         color_option = st.selectbox("Color by:", categorical_cols)
                 
                 if columns_for_pairplot and len(columns_for_pairplot) >= 2:
-                    if st.button("Generate Pair Plot"):
-                        fig = px.scatter_matrix(
-                            df, dimensions=columns_for_pairplot, color=color_option,
-                            title="Pair Plot",
-                            template="plotly_dark"
+                    figure_params = ("Pair Plot", tuple(columns_for_pairplot), color_option, point_budget)
+                    figure = get_cached_figure(file_name, figure_params)
+                    if st.button("Generate Pair Plot") and figure is None:
+                        # Every sampled row is drawn once per off-diagonal panel
+                        panels = len(columns_for_pairplot) * (len(columns_for_pairplot) - 1)
+                        strata = get_pair_plot_order(file_name, df, color_option)
+                        sample = pair_plot_sample(strata, max(1, point_budget // panels))
+                        fig, density_panels = pair_plot_figure(
+                            df, sample, columns_for_pairplot, color=color_option, title="Pair Plot"
                         )
                         
                         fig.update_layout(
@@ -1221,7 +2659,15 @@ elif selected == "Visualize":
                             font=dict(color="white")
                         )
                         
-                        st.plotly_chart(fig, use_container_width=True)
+                        caption = f"Scatter panels show a sample of {len(sample):,} of {len(df):,} rows"
+                        if color_option:
+                            caption += f", stratified by {color_option}"
+                        if density_panels:
+                            caption += f"; {density_panels} dense panels show 2-D histograms of all rows"
+                        figure = cache_figure(file_name, figure_params, fig, [caption + "."])
+                    
+                    if figure:
+                        show_figure(*figure)
                 else:
                     st.warning("Please select at least 2 columns for the pair plot.")
             else:
@@ -1232,22 +2678,26 @@ elif selected == "Visualize":
             if numeric_cols:
                 st.markdown("### Numeric Column Statistics")
                 
+                # Statistics and bins come from per-version caches
+                summaries = get_summary_statistics(file_name, df, numeric_cols[:5])
+                
                 for col in numeric_cols[:5]:  # Limit to first 5 numeric columns
                     st.markdown(f"#### {col}")
                     
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        st.metric("Mean", f"{df[col].mean():.2f}")
+                        st.metric("Mean", f"{summaries[col]['mean']:.2f}")
                     
                     with col2:
-                        st.metric("Median", f"{df[col].median():.2f}")
+                        st.metric("Median", f"{summaries[col]['50%']:.2f}")
                     
                     with col3:
-                        st.metric("Std Dev", f"{df[col].std():.2f}")
+                        st.metric("Std Dev", f"{summaries[col]['std']:.2f}")
                     
                     # Create a small histogram
-                    fig = px.histogram(df, x=col, template="plotly_dark")
+                    edges, counts = get_histogram_bins(file_name, df, col, INSIGHTS_HISTOGRAM_BINS)
+                    fig = histogram_figure(edges, counts, col)
                     fig.update_layout(
                         height=200,
                         margin=dict(l=20, r=20, t=30, b=20),
@@ -1291,16 +2741,13 @@ elif selected == "Convert":
     if st.session_state.current_file:
         file_name = st.session_state.current_file
         
-        # Get the processed data
-        if file_name in st.session_state.processed_data:
-            df = st.session_state.processed_data[file_name]
-        else:
-            df = st.session_state.files[file_name]["data"]
+        # Get the processed data, running any queued cleaning operations
+        df = get_processed_data(file_name)
         
         st.markdown(f"## 🔄 Converting: {file_name}")
         
         # File statistics
-        create_file_stats_cards(df)
+        create_file_stats_cards(df, file_name)
         
         # Conversion options
         st.markdown("### Conversion Options")
@@ -1311,16 +2758,27 @@ elif selected == "Convert":
             # Output format
             output_format = st.radio(
                 "Output format:",
-                ["CSV", "Excel", "JSON", "HTML", "Markdown"]
+                ["CSV", "Excel", "JSON", "HTML", "Markdown", "Parquet", "Feather", "Arrow IPC"]
             )
             
             # Include index
             include_index = st.checkbox("Include row index", value=False)
             
-            # Compression options for CSV
+            # Every loaded file as one sheet of a single workbook
+            all_files_workbook = False
+            if output_format == "Excel" and len(st.session_state.processed_data) > 1:
+                all_files_workbook = st.checkbox(
+                    "Export all files as sheets of one workbook",
+                    help="Each file's processed data becomes a sheet; column and row filters apply to the current file only."
+                )
+            
+            # Compression options for text formats
             compression = None
-            if output_format == "CSV":
-                use_compression = st.checkbox("Compress output file")
+            if output_format in COMPRESSIBLE_FORMATS:
+                use_compression = st.checkbox(
+                    "Compress output file",
+                    help="gzip and xz compress blocks of the file in parallel on every core."
+                )
                 if use_compression:
                     compression = st.selectbox("Compression type:", ["gzip", "zip", "bz2", "xz"])
         
@@ -1339,7 +2797,7 @@ elif selected == "Convert":
             
             row_filter_expr = None
             if use_row_filter:
-                st.markdown("Enter a Python expression to filter rows, e.g., `df['Age'] > 30`")
+                st.markdown("Enter a filter expression using column names, e.g., `Age > 30 and City == 'Paris'`")
                 row_filter_expr = st.text_area("Filter expression:")
         
         # Preview filtered data
@@ -1348,7 +2806,7 @@ elif selected == "Convert":
             
             if use_row_filter and row_filter_expr:
                 try:
-                    filtered_df = filtered_df[eval(row_filter_expr)]
+                    filtered_df = filtered_df[filter_mask(row_filter_expr, df)]
                     st.success(f"Filter applied: {len(filtered_df)} rows match the criteria.")
                 except Exception as e:
                     st.error(f"Error applying filter: {str(e)}")
@@ -1356,31 +2814,85 @@ elif selected == "Convert":
             st.markdown("### Preview")
             st.dataframe(filtered_df.head(5), use_container_width=True)
             
-            # Generate download link
-            if st.button("Generate Download Link"):
+            source_path = st.session_state.files[file_name].get("source_path")
+            if source_path:
+                # Out-of-core files are streamed from disk through the recorded cleaning steps
+                output_extension = OUT_OF_CORE_OUTPUT_EXTENSIONS.get(output_format, ".csv")
+                history = st.session_state.cleaning_history.get(file_name, [])
+                source_columns = read_file_columns(source_path)
+                
+                # Only the columns the selection, the row filter and the cleaning steps depend on are read
+                row_filter = None
+                needed_columns = selected_columns
+                if use_row_filter and row_filter_expr:
+                    row_filter = lambda chunk: filter_mask(row_filter_expr, chunk)
+                    try:
+                        filter_columns = expression_columns(row_filter_expr)
+                        needed_columns = selected_columns + [col for col in filter_columns if col not in selected_columns]
+                    except ExpressionError:
+                        pass  # Reported with the preview above, and again if the export is run
+                read_columns, operations = project_operations(history, needed_columns, source_columns)
+                
+                st.info(
+                    f"The export reads {len(read_columns or source_columns)} of {len(source_columns)} columns of "
+                    f"{os.path.basename(source_path)} in chunks of {CSV_CHUNK_ROWS:,} rows and writes "
+                    f"{output_extension[1:].upper()} to {OUT_OF_CORE_OUTPUT_DIR} on the server."
+                )
+                if output_format not in OUT_OF_CORE_OUTPUT_EXTENSIONS:
+                    st.caption(f"{output_format} cannot be written in chunks, so the export is written as CSV.")
+                
+                if st.button("Export full file"):
+                    os.makedirs(OUT_OF_CORE_OUTPUT_DIR, exist_ok=True)
+                    output_path = os.path.join(
+                        OUT_OF_CORE_OUTPUT_DIR, os.path.splitext(file_name)[0] + "_cleaned" + output_extension
+                    )
+                    
+                    try:
+                        with st.spinner(f"Streaming {file_name}..."):
+                            rows_in, rows_out = stream_operations_to_file(
+                                chunk_reader(source_path, CSV_CHUNK_ROWS, read_columns),
+                                operations,
+                                output_path,
+                                columns=selected_columns,
+                                row_filter=row_filter
+                            )
+                        st.success(f"✅ Wrote {rows_out:,} of {rows_in:,} rows to {output_path}")
+                    except Exception as e:
+                        st.error(f"Error exporting file: {str(e)}")
+            
+            # Serialize on click and serve the bytes as a file download
+            elif st.button("Prepare download"):
                 try:
-                    if output_format == "CSV":
-                        download_link = get_download_link(filtered_df, file_name, "CSV")
-                    elif output_format == "Excel":
-                        download_link = get_download_link(filtered_df, file_name, "Excel")
-                    elif output_format == "JSON":
-                        download_link = get_download_link(filtered_df, file_name, "JSON")
-                    elif output_format == "HTML":
-                        html = filtered_df.to_html(index=include_index)
-                        b64 = base64.b64encode(html.encode()).decode()
-                        href = f'data:text/html;base64,{b64}'
-                        download_filename = file_name.split('.')[0] + '.html'
-                        download_link = f'<a href="{href}" class="download-btn" download="{download_filename}">⬇️ Download HTML</a>'
-                    elif output_format == "Markdown":
-                        markdown = filtered_df.to_markdown(index=include_index)
-                        b64 = base64.b64encode(markdown.encode()).decode()
-                        href = f'data:text/markdown;base64,{b64}'
-                        download_filename = file_name.split('.')[0] + '.md'
-                        download_link = f'<a href="{href}" class="download-btn" download="{download_filename}">⬇️ Download Markdown</a>'
+                    with st.spinner(f"Writing {output_format}..."):
+                        if all_files_workbook:
+                            # Out-of-core files only hold a sample in memory, so they are left out
+                            frames = {
+                                name: filtered_df if name == file_name else get_processed_data(name)
+                                for name in list(st.session_state.processed_data)
+                                if "source_path" not in st.session_state.files.get(name, {})
+                            }
+                            data, download_filename, mime, report = get_workbook_download_file(
+                                frames, "data_sweeper_export.xlsx", include_index
+                            )
+                        else:
+                            data, download_filename, mime, report = get_download_file(
+                                filtered_df, file_name, output_format, include_index, compression
+                            )
                     
-                    st.markdown(download_link, unsafe_allow_html=True)
+                    throughput = report["bytes_in"] / report["seconds"] if report["seconds"] > 0 else 0
+                    summary = f"{get_file_size_display(report['bytes_in'])} written in {report['seconds']:.2f}s ({get_file_size_display(throughput)}/s)"
+                    if compression:
+                        ratio = report["bytes_in"] / report["bytes_out"] if report["bytes_out"] else 0
+                        summary += f", {compression} compressed to {get_file_size_display(report['bytes_out'])} ({ratio:.1f}x smaller)"
+                    st.caption(summary)
+                    st.download_button(
+                        f"⬇️ Download {output_format}",
+                        data=data,
+                        file_name=download_filename,
+                        mime=mime
+                    )
                 except Exception as e:
-                    st.error(f"Error generating download link: {str(e)}")
+                    st.error(f"Error preparing download: {str(e)}")
     else:
         st.info("Please upload a file in the Upload section first.")
 
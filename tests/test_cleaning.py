@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cleaning
+from cleaning import (
+    RowHashIndex,
+    apply_operations,
+    chunk_reader,
+    hash_rows,
+    load_recipe,
+    resolve_global_statistics,
+    stream_operations_to_file,
+    write_file_chunks
+)
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 500
+    frame = pd.DataFrame({
+        "A": rng.normal(size=n),
+        "B": rng.integers(0, 5, size=n),
+        "C": rng.choice(["x", "y", "z"], size=n),
+        "D": rng.integers(0, 3, size=n).astype(float)
+    })
+    frame.loc[::7, "A"] = np.nan
+    frame.loc[::11, "C"] = None
+    frame.loc[::40, "A"] = 50.0
+    return pd.concat([frame, frame.iloc[:20]], ignore_index=True)
+
+
+OPERATIONS = [
+    {"op": "fillna", "strategy": "median", "columns": ["A"]},
+    {"op": "fillna", "strategy": "value", "columns": ["C"], "value": "missing"},
+    {"op": "rename_columns", "mapping": {"B": "Count"}},
+    {"op": "rename_columns", "mapping": {"Count": "Total"}},
+    {"op": "drop_duplicates"},
+    {"op": "remove_outliers", "column": "A", "method": "iqr", "threshold": 1.5},
+    {"op": "filter_range", "column": "Total", "lower": 1, "upper": 4},
+    {"op": "calculate_column", "column": "E", "left": "A", "operator": "*", "right": "Total"},
+    {"op": "expression_column", "column": "F", "expression": "where(D > 0, E / D, 0)"},
+    {"op": "convert_type", "column": "D", "target": "integer"},
+    {"op": "text_operations", "column": "C", "operations": ["Uppercase"]},
+    {"op": "drop_columns", "columns": ["E"]}
+]
+
+
+def apply_one_by_one(df, operations):
+    for operation in operations:
+        df, _ = apply_operations(df, [operation])
+    return df
+
+
+@pytest.mark.parametrize("columns", [None, ["C"], ["B"], ["B", "C"]])
+def test_hash_rows_matches_duplicated(df, columns):
+    labels = hash_rows(df, columns)
+    assert (pd.Series(labels).duplicated().to_numpy() == df.duplicated(subset=columns).to_numpy()).all()
+
+
+def test_hash_rows_keeps_mixed_types_apart():
+    df = pd.DataFrame({"A": ["1", 1, 1.0, None, np.nan, "1"]})
+    assert pd.Series(hash_rows(df)).duplicated().tolist() == df.duplicated().tolist()
+
+
+def test_fused_operations_match_sequential(df):
+    fused, _ = apply_operations(df, OPERATIONS)
+    pd.testing.assert_frame_equal(fused, apply_one_by_one(df, OPERATIONS))
+
+
+@pytest.mark.parametrize("operations", [
+    OPERATIONS[:2],
+    OPERATIONS[2:4],
+    [
+        {"op": "drop_duplicates"},
+        {"op": "remove_outliers", "column": "A", "method": "zscore", "threshold": 2},
+        {"op": "filter_range", "column": "B", "lower": 1, "upper": 3}
+    ],
+    [{"op": "drop_columns", "columns": ["D"]}, {"op": "dropna"}],
+    [{"op": "text_operations", "column": "C", "operations": ["Uppercase"]}],
+])
+def test_carried_forward_stats_match_fresh(df, operations):
+    stats = {"null_counts": df.isna().sum(), "row_hashes": RowHashIndex(), "duplicates": None}
+    for subset in (None, ["B"], ["C"]):
+        stats["row_hashes"].hashes(df, subset)
+
+    result, stats = apply_operations(df, operations, stats)
+    pd.testing.assert_series_equal(stats["null_counts"], result.isna().sum(), check_names=False)
+    for subset in (None, ["B"], ["Total"], ["C"]):
+        if subset is not None and not set(subset) <= set(result.columns):
+            continue
+        expected = result.duplicated(subset=subset).to_numpy()
+        assert (stats["row_hashes"].duplicated(result, subset) == expected).all()
+
+
+@pytest.mark.parametrize("exact_values", [1_000_000, 10, 0])
+def test_streamed_quantiles_match_in_memory(df, monkeypatch, exact_values):
+    # A small limit forces the radix passes; 0 resolves every key bit
+    monkeypatch.setattr(cleaning, "QUANTILE_EXACT_VALUES", exact_values)
+    values = df[["A"]].copy()
+    values.loc[3, "A"] = -0.0
+    chunks = [values.iloc[i:i + 64] for i in range(0, len(values), 64)]
+    resolved = resolve_global_statistics(lambda: iter(chunks), [
+        {"op": "fillna", "strategy": "median", "columns": ["A"]},
+        {"op": "remove_outliers", "column": "A", "method": "iqr", "threshold": 1.5}
+    ])
+
+    filled = values["A"].fillna(values["A"].median())
+    q1, q3 = filled.quantile(0.25), filled.quantile(0.75)
+    assert resolved[0]["value"] == values["A"].median()
+    assert resolved[1]["lower"] == q1 - 1.5 * (q3 - q1)
+    assert resolved[1]["upper"] == q3 + 1.5 * (q3 - q1)
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_streamed_file_matches_in_memory(tmp_path, extension):
+    n = 1_000
+    source = pd.DataFrame({
+        "A": np.arange(n, dtype=float),
+        # Empty in the first chunks, text later
+        "Note": [None] * 700 + ["late text"] * 300
+    })
+    source.loc[::9, "A"] = np.nan
+    source_path = tmp_path / "source.csv"
+    source.to_csv(source_path, index=False)
+    operations = [
+        {"op": "fillna", "strategy": "median", "columns": ["A"]},
+        {"op": "remove_outliers", "column": "A", "method": "zscore", "threshold": 1.5},
+        {"op": "convert_type", "column": "Note", "target": "category"}
+    ]
+
+    output_path = str(tmp_path / f"out{extension}")
+    rows_in, rows_out = stream_operations_to_file(chunk_reader(str(source_path), 250), operations, output_path)
+
+    expected, _ = apply_operations(pd.read_csv(source_path), operations)
+    result = read_back(output_path)
+    assert (rows_in, rows_out) == (n, len(expected))
+    assert np.allclose(result["A"].to_numpy(), expected["A"].to_numpy())
+    assert result["Note"].fillna("").tolist() == expected["Note"].astype(object).fillna("").tolist()
+
+
+def test_load_recipe_names_the_incomplete_step():
+    recipe = '{"operations": [{"op": "dropna"}, {"op": "fillna", "strategy": "value", "columns": ["A"]}]}'
+    with pytest.raises(ValueError, match="step 2"):
+        load_recipe(recipe)
+
+
+def read_back(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_feather(path)
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather", ".arrow"])
+def test_chunked_writer_with_categories(tmp_path, extension):
+    # Each chunk has its own categories, and the second has more than an int8 dictionary index holds
+    first = pd.DataFrame({"Category": pd.Categorical(["a", "b"]), "Empty": [None, None]})
+    second = pd.DataFrame({
+        "Category": pd.Categorical([f"v{i}" for i in range(200)]),
+        "Empty": ["late text"] * 200
+    })
+    path = str(tmp_path / f"out{extension}")
+    write_file_chunks(iter([first, second]), path)
+
+    result = read_back(path)
+    assert result["Category"].tolist() == ["a", "b"] + [f"v{i}" for i in range(200)]
+    assert result["Empty"].tolist()[2:] == ["late text"] * 200
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_chunked_writer_removes_partial_output(tmp_path, extension):
+    def chunks():
+        yield pd.DataFrame({"A": np.arange(3)})
+        raise RuntimeError("read failed")
+
+    path = tmp_path / f"out{extension}"
+    with pytest.raises(RuntimeError):
+        write_file_chunks(chunks(), str(path))
+    assert not path.exists()
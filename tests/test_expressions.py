@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from expressions import MAX_TEXT_WIDTH, ExpressionError, compile_expression, evaluate_expression, filter_mask
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Age": [25, 35, 45],
+        "City": ["Paris", "London", "paris"],
+        "Price": [10.0, 2.5, 4.0],
+        "Stock": np.array([0, 3, 99], dtype=np.int8),
+        "Unit Price": [1.0, 2.0, 3.0],
+        "Active": [True, False, True],
+    })
+
+
+# Examples from the README
+def test_where(df):
+    assert evaluate_expression("where(Stock > 0, Price * Stock, 0)", df).tolist() == [0.0, 7.5, 396.0]
+
+
+def test_filter_with_and_and_str(df):
+    assert filter_mask("Age > 30 and City.str.lower() == 'paris'", df).tolist() == [False, False, True]
+
+
+@pytest.mark.parametrize("expression", ["Price * 2", "df['Unit Price'] * 2", "col('Unit Price') * 2"])
+def test_column_references(df, expression):
+    column = "Price" if expression.startswith("Price") else "Unit Price"
+    assert evaluate_expression(expression, df).tolist() == (df[column] * 2).tolist()
+
+
+def test_in_list(df):
+    assert evaluate_expression("City in ['Paris', 'London']", df).tolist() == [True, True, False]
+
+
+def test_compacted_integers_do_not_wrap(df):
+    assert evaluate_expression("Stock * Stock", df).tolist() == [0, 9, 9801]
+
+
+def test_logical_operators(df):
+    assert evaluate_expression("not Active", df).tolist() == [False, True, False]
+    assert evaluate_expression("Active or Age > 40", df).tolist() == [True, False, True]
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "Price.__class__",
+    "df.__dict__",
+    "Price.__class__.__bases__",
+    "(lambda: 1)()",
+    "np.save('out', Price)",
+    "Price.apply(len)",
+    "Price.pipe(print)",
+    "df.pipe(print)",
+    "open('README.md')",
+    "[x for x in Price]",
+    "'abc' * 1000000000",
+    "City.str.repeat(1000000000)",
+])
+def test_rejected_constructs(df, expression):
+    with pytest.raises(ExpressionError):
+        evaluate_expression(expression, df)
+
+
+@pytest.mark.parametrize("expression", [
+    "not Stock",
+    "Stock and Active",
+    "City * 1000000000",
+    "1000000000 * City",
+    "City.str.pad(1000000000)",
+    "City.str.pad(width=1000000000)",
+    "City.str.zfill(1000000000)",
+    "City.str.slice(0, 1000000000)",
+    "City.str.cat()",
+    "City + City.str.cat()",
+    "City.str.replace('', 'x')",
+    "City.str.replace('a', 'x' * 2)",
+    "City.str.pad(1000).str.replace(' ', 'xxx')",
+    "City.str.replace('a', '%s')" % ('x' * (MAX_TEXT_WIDTH + 2)),
+    "City.str.replace('a', 'b', regex=True)",
+    "City.str.contains('(a+)+$', regex=True)",
+    "City.str.split('a+', regex=True)",
+])
+def test_rejected_at_evaluation(df, expression):
+    with pytest.raises(ExpressionError):
+        evaluate_expression(expression, df)
+
+
+def test_text_methods_within_limits(df):
+    assert evaluate_expression("City.str.pad(7, fillchar='-')", df).tolist() == ["--Paris", "-London", "--paris"]
+    assert evaluate_expression("City.str.slice(0, 3).str.cat(City, sep='/')", df).tolist() == [
+        "Par/Paris", "Lon/London", "par/paris"
+    ]
+
+
+def test_text_filter_with_missing_values():
+    df = pd.DataFrame({"City": pd.Series(["Paris", None, "Lyon"], dtype=object)})
+    assert filter_mask("City.str.contains('P', na=False)", df).tolist() == [True, False, False]
+    assert filter_mask("City.str.startswith('L', na=False)", df).tolist() == [False, False, True]
+    assert filter_mask("City.str.contains('P').fillna(False)", df).tolist() == [True, False, False]
+    # Rows where the filter is missing are dropped
+    assert filter_mask("not City.str.contains('P')", df).tolist() == [False, False, True]
+
+
+def test_split_expand(df):
+    assert evaluate_expression("City.str.split('o', expand=True)", df).shape == (3, 3)
+
+
+def test_patterns_are_plain_text(df):
+    assert evaluate_expression("City.str.contains('.')", df).tolist() == [False, False, False]
+    assert evaluate_expression("City.str.replace('a', '-')", df).tolist() == ["P-ris", "London", "p-ris"]
+
+
+def test_unknown_column_with_schema(df):
+    with pytest.raises(ExpressionError):
+        evaluate_expression("Missing + 1", df)
+    # Without a schema column names are not checked
+    assert compile_expression("Missing + 1").columns == ("Missing",)